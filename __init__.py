@@ -5,46 +5,106 @@ __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
 # Public API
-from ._api import get, get_all, install, load, register, switch, themes_path, uninstall
+from ._api import get, get_all, install, load, register, switch, themes_path, uninstall, resolve_location, \
+    cache_stats, logo_url, footer_logo_url, install_async, get_job, load_timings, \
+    preload, set_request_theme
+from ._selector import register_selector
+from ._theme_settings import ThemeSettings, on_change as on_settings_change
 
 
 def _update_themes():
     import subprocess
-    import semaver
-    from os import path
-    from pytsite import console, lang, pip, plugman
+    from os import path, cpu_count
+    from time import monotonic
+    from concurrent.futures import ThreadPoolExecutor
+    from pytsite import console, lang, pip, plugman, reg
     from plugins import assetman
-    from . import _api
-
-    for theme in _api.get_all().values():
-        # Update theme from git repository
-        if path.exists(path.join(theme.path, '.git')):
-            console.print_info(lang.t('theming@updating_theme', {'name': theme.name}))
-            subprocess.call(['git', '-C', theme.path, 'pull'])
-
-        console.print_info(lang.t('theming@installing_theme_requirements', {'name': theme.name}))
-
-        # Install/upgrade required pip packagers
-        for p_name, p_ver in theme.requires['packages'].items():
-            pip.install(p_name, p_ver, True)
-
-        # Install or update required plugins
-        for p_name, p_ver in theme.requires['plugins'].items():
-            plugman.install(p_name, semaver.VersionRange(p_ver))
-
-        # Compile theme assets
-        if assetman.is_package_registered(theme.package_name):
-            assetman.build(theme.package_name)
+    from . import _api, _build, _error, _requirements
+
+    themes = list(_api.get_all().values())
+    timings = {theme.name: {'git': 0.0, 'build': 0.0} for theme in themes}
+    max_workers = reg.get('theme.update_workers', min(cpu_count() or 1, 4))
+
+    # Update theme from git repository
+    def git_pull(theme):
+        t_start = monotonic()
+        console.print_info(lang.t('theming@updating_theme', {'name': theme.name}))
+        subprocess.call(['git', '-C', theme.path, 'pull'])
+        timings[theme.name]['git'] = monotonic() - t_start
+
+    # Compile theme assets
+    def build(theme):
+        t_start = monotonic()
+        _build.build(theme.package_name, theme.path, False)
+        timings[theme.name]['build'] = monotonic() - t_start
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        list(executor.map(git_pull, [t for t in themes if path.exists(path.join(t.path, '.git'))]))
+
+    # Requirements shared by several themes are installed only once
+    console.print_info(lang.t('theming@installing_themes_requirements'))
+    try:
+        requires = {
+            'packages': _requirements.merge([t.requires['packages'] for t in themes]),
+            'plugins': _requirements.merge([t.requires['plugins'] for t in themes]),
+        }
+    except _error.ThemeRequirementsConflict as e:
+        # Installing requirements without the conflicting constraints would break some of the themes
+        console.print_error(e)
+        requires = None
+
+    # Requirements are not installed again if nothing has changed since previous update
+    req_miss = _requirements.resolution_miss('update', requires) if requires else None
+    if not requires:
+        requires = {'packages': {}, 'plugins': {}}
+    elif req_miss:
+        console.print_info(lang.t('theming@themes_requirements_resolving', {'reason': req_miss}))
+    else:
+        console.print_info(lang.t('theming@themes_requirements_unchanged'))
+        requires = {'packages': {}, 'plugins': {}}
+
+    t_start = monotonic()
+    for p_name, p_ver in requires['packages'].items():
+        pip.install(p_name, p_ver, True)
+    pip_duration = monotonic() - t_start
+
+    t_start = monotonic()
+    for p_name, p_ver in requires['plugins'].items():
+        plugman.install(p_name, p_ver)
+    plugins_duration = monotonic() - t_start
+
+    if req_miss:
+        _requirements.store_resolution('update', requires)
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        list(executor.map(build, [t for t in themes if assetman.is_package_registered(t.package_name)]))
+
+    # Timing summary
+    for name, t in timings.items():
+        console.print_info(lang.t('theming@theme_update_timings', {
+            'name': name,
+            'git': '{:.2f}'.format(t['git']),
+            'build': '{:.2f}'.format(t['build']),
+        }))
+    console.print_info(lang.t('theming@themes_requirements_update_timings', {
+        'pip': '{:.2f}'.format(pip_duration),
+        'plugins': '{:.2f}'.format(plugins_duration),
+    }))
 
 
 def plugin_load():
     from os import listdir, path, makedirs
     from pytsite import console, lang, update, tpl, reg, on_app_load
-    from plugins import assetman, file
-    from . import _api, _error, _eh
+    from plugins import assetman
+    from . import _api, _error, _eh, _index, _console_command
 
     themes_dir = _api.themes_path()
 
+    # Share compiled templates between application processes
+    if reg.get('theme.tpl_bytecode_cache', True):
+        from . import _tpl
+        _tpl.enable_bytecode_cache(path.join(_api.storage_path(), 'tpl'))
+
     # Create themes directory
     if not path.isdir(themes_dir):
         makedirs(themes_dir, 0o755)
@@ -52,44 +112,33 @@ def plugin_load():
     # Register all themes found in the themes directory
     themes_names = sorted(listdir(themes_dir))
     if themes_names:
+        themes_metadata = _index.load(themes_dir)
         for name in themes_names:
             if not path.isdir(themes_dir) or name.startswith('_') or name.startswith('.'):
                 continue
 
             try:
-                _api.register('themes.' + name)
+                _api.register('themes.' + name, themes_metadata.get(name))
             except _error.ThemeInitError as e:
                 console.print_warning("Theme '{}' wasn't registered: {}".format(name, e))
+
+        # Refresh metadata index of registered themes
+        _index.save(themes_dir, _api.get_all().values())
     else:
         raise _error.NoThemesFound(themes_dir)
 
+    # Console commands
+    console.register_command(_console_command.Timings())
+
     # Lng events handlers
     lang.on_split_msg_id(_eh.on_lang_split_msg_id)
 
     # Assetman events handlers
     assetman.on_split_location(_eh.on_assetman_split_location)
 
-    # App's logo URL resolver
-    def logo_url(width: int = 0, height: int = 0, enlarge: bool = False):
-        s = reg.get('theme.logo')
-        try:
-            return file.get(s).get_url(width=width, height=height, enlarge=enlarge) if s else \
-                assetman.url('$theme@img/appicon.png')
-        except file.error.FileNotFound:
-            return assetman.url('$theme@img/appicon.png')
-
-    # App's footer logo URL resolver
-    def footer_logo_url(width: int = 0, height: int = 0, enlarge: bool = False):
-        s = reg.get('theme.logo_footer')
-        try:
-            return file.get(s).get_url(width=width, height=height, enlarge=enlarge) if s else \
-                assetman.url('$theme@img/appicon-footer.png')
-        except file.error.FileNotFound:
-            return assetman.url('$theme@img/appicon-footer.png')
-
     # Tpl globals and events listeners
-    tpl.register_global('theme_logo_url', logo_url)
-    tpl.register_global('theme_footer_logo_url', footer_logo_url)
+    tpl.register_global('theme_logo_url', _api.logo_url)
+    tpl.register_global('theme_footer_logo_url', _api.footer_logo_url)
 
     # Events handlers
     tpl.on_resolve_location(_eh.on_tpl_resolve_location)
@@ -102,7 +151,7 @@ def plugin_install():
 
 
 def plugin_load_wsgi():
-    from pytsite import router
+    from pytsite import router, reg
     from plugins import http_api, settings
     from . import _api, _eh, _http_api_controllers, _error, _settings_form
 
@@ -111,8 +160,14 @@ def plugin_load_wsgi():
 
     # Events handlers
     router.on_dispatch(_eh.on_router_dispatch)
+    if reg.get('theme.multi', False):
+        router.on_pre_dispatch(_eh.on_router_pre_dispatch, method='*')
+        router.on_xhr_pre_dispatch(_eh.on_router_pre_dispatch, method='*')
 
     # HTTP API handlers
+    http_api.handle('GET', 'theme', _http_api_controllers.Get, 'theming@get')
     http_api.handle('POST', 'theme', _http_api_controllers.Install, 'theming@install')
+    http_api.handle('GET', 'theme/job/<uid>', _http_api_controllers.GetJob, 'theming@get_job')
+    http_api.handle('GET', 'theme/timings', _http_api_controllers.GetTimings, 'theming@get_timings')
     http_api.handle('PATCH', 'theme', _http_api_controllers.Switch, 'theming@switch')
     http_api.handle('DELETE', 'theme', _http_api_controllers.Uninstall, 'theming@uninstall')
@@ -4,17 +4,29 @@ __author__ = 'Oleksandr Shepetko'
 __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
-from typing import Dict
-from os import path, unlink, chdir, getcwd, rmdir
-from shutil import rmtree, move
-from zipfile import ZipFile
-from glob import glob
-from semaver import VersionRange
-from pytsite import reg, logger, util, reload, plugman, pip
-from . import _theme, _error
+from typing import Dict, Callable, Iterable, List, Optional
+from os import path
+from threading import RLock
+from time import monotonic
+from pytsite import reg, logger, reload, threading
+from . import _theme, _error, _cache, _images
 
 _themes_path = path.join(reg.get('paths.root'), 'themes')
 
+# Location of theming plugin's persistent data
+_storage_path = reg.get('theme.storage_path', path.join(reg.get('paths.storage'), 'theming'))
+
+# Resolved resource locations per theme. It is a plain dict, because lookups are made several times per template
+# render and must be cheaper than resolution itself.
+_locations = {}  # type: Dict[Optional[_theme.Theme], Dict[str, str]]
+_locations_max_size = reg.get('theme.locations_cache_size', 4096)
+
+# Fingerprints of registered themes set
+_fingerprints = _cache.create_pool('fingerprints', 16)
+
+# Resolved logo URLs
+_logos = _cache.create_pool('logos', reg.get('theme.logos_cache_size', 256))
+
 # All registered themes
 _fallback_theme_name = {}  # type: Dict[str, _theme.Theme]
 
@@ -24,40 +36,83 @@ _default = None  # type: _theme.Theme
 # Currently loaded theme
 _loaded = None  # type: _theme.Theme
 
+# Themes loaded in addition to current one
+_preloaded = {}  # type: Dict[str, _theme.Theme]
+
+# Themes selected for requests being processed, per thread
+_request_themes = {}  # type: Dict[int, _theme.Theme]
+
+# Hot switch state
+_switch_lock = RLock()
+_synced_at = 0.0
+_failed_sync = None  # type: Optional[str]
+
 
-def _extract_archive(src_file_path: str, dst_dir_path):
-    """Extract theme archive
+def themes_path():
+    """Get absolute filesystem path to themes location
     """
-    # Extract all files
-    with ZipFile(src_file_path) as z_file:
-        z_file.extractall(dst_dir_path)
+    return _themes_path
 
-    # Check if the archive contents only single directory, move its files up
-    orig_cwd = getcwd()
-    chdir(dst_dir_path)
-    files_list = glob('*')
-    if len(files_list) == 1 and path.isdir(files_list[0]):
-        top_directory = files_list[0]
-        chdir(top_directory)
 
-        f_names = glob('*') + glob('.*')
-        for f_name in f_names:
-            if f_name not in ('.', '..'):
-                move(f_name, dst_dir_path)
+def storage_path() -> str:
+    """Get absolute filesystem path to the theming plugin's persistent data location
+    """
+    return _storage_path
 
-        chdir('..')
-        rmdir(top_directory)
 
-    chdir(orig_cwd)
+def _current() -> Optional[_theme.Theme]:
+    """Get theme selected for current request or loaded theme
+    """
+    if _request_themes:
+        theme = _request_themes.get(threading.get_id())
+        if theme:
+            return theme
 
-    logger.debug("Theme files successfully extracted from file '{}' to directory '{}'".
-                 format(src_file_path, dst_dir_path))
+    return _loaded or _default
 
 
-def themes_path():
-    """Get absolute filesystem path to themes location
+def is_preloaded(package_name: str) -> bool:
+    """Check if a theme can be selected per request
     """
-    return _themes_path
+    return package_name in _preloaded
+
+
+def set_request_theme(package_name: Optional[str]):
+    """Set theme for current request
+
+    Only preloaded themes can be selected, otherwise loaded theme is used.
+    """
+    theme = _preloaded.get(package_name) if package_name else None
+
+    if theme:
+        _request_themes[threading.get_id()] = theme
+    else:
+        # Package name may come from the client, so it is not worth a warning
+        if package_name:
+            logger.debug("Theme '{}' cannot be selected for a request, because it is not preloaded".
+                         format(package_name))
+        _request_themes.pop(threading.get_id(), None)
+
+
+def preload(package_names: Iterable[str]) -> List[_theme.Theme]:
+    """Load additional themes, which can be selected per request
+    """
+    from . import _build
+
+    r = []
+
+    with _switch_lock:
+        for package_name in package_names:
+            theme = get(package_name)
+            if not theme.is_loaded:
+                # Assets of each preloaded theme are tracked by their own build digest
+                theme.load(not _build.is_up_to_date(package_name, theme.path))
+            _preloaded[package_name] = theme
+            r.append(theme)
+
+    _clear_caches()
+
+    return r
 
 
 def get(package_name: str = None) -> _theme.Theme:
@@ -67,7 +122,7 @@ def get(package_name: str = None) -> _theme.Theme:
         raise _error.NoThemesRegistered()
 
     if not package_name:
-        return _loaded or _default
+        return _current()
 
     try:
         return _fallback_theme_name[package_name]
@@ -75,20 +130,184 @@ def get(package_name: str = None) -> _theme.Theme:
         raise _error.ThemeNotRegistered(package_name)
 
 
-def switch(package_name: str):
+def resolve_location(location: str) -> str:
+    """Resolve '$theme' reference in a resource location
+    """
+    theme = _request_themes.get(threading.get_id()) if _request_themes else None
+    if theme is None:
+        theme = _loaded or _default
+
+    try:
+        return _locations[theme][location]
+    except KeyError:
+        pass
+
+    resolved = location
+    if '@' not in resolved:
+        resolved = '$theme@' + resolved
+
+    if '$theme' in resolved:
+        resolved = resolved.replace('$theme', get().package_name)
+
+    locations = _locations.setdefault(theme, {})
+
+    # Locations are mostly defined by code, so the limit is reached only if they are built from user input
+    if len(locations) >= _locations_max_size:
+        locations.clear()
+
+    locations[location] = resolved
+
+    return resolved
+
+
+def _clear_caches():
+    """Clear caches which depend on current theme
+    """
+    _locations.clear()
+    _cache.clear()
+
+
+def _image_url(setting: str, fallback: str, width: int = 0, height: int = 0, enlarge: bool = False) -> str:
+    """Get URL of an image stored in settings
+    """
+    from plugins import assetman, file
+
+    fid = reg.get(setting)
+    key = (get().package_name, setting, fid, width, height, enlarge)
+
+    try:
+        return _logos.get(key)
+    except KeyError:
+        pass
+
+    if not fid:
+        return _logos.put(key, assetman.url(fallback))
+
+    # Derivatives generated when settings were saved
+    derivative = _images.get(setting, width, height, enlarge)
+    if derivative:
+        return _logos.put(key, derivative['url'])
+
+    try:
+        return _logos.put(key, file.get(fid).get_url(width=width, height=height, enlarge=enlarge))
+    except file.error.FileNotFound:
+        # Other URLs of the file are not valid anymore
+        _logos.clear()
+        return assetman.url(fallback)
+
+
+def logo_url(width: int = 0, height: int = 0, enlarge: bool = False) -> str:
+    """Get app's logo URL
+    """
+    return _image_url('theme.logo', '$theme@img/appicon.png', width, height, enlarge)
+
+
+def footer_logo_url(width: int = 0, height: int = 0, enlarge: bool = False) -> str:
+    """Get app's footer logo URL
+    """
+    return _image_url('theme.logo_footer', '$theme@img/appicon-footer.png', width, height, enlarge)
+
+
+def fingerprint() -> str:
+    """Get fingerprint of registered themes set and current theme
+    """
+    current = get().package_name
+
+    try:
+        return _fingerprints.get(current)
+    except KeyError:
+        pass
+
+    import hashlib
+
+    data = ';'.join([current] + ['{}={}'.format(p, t.version) for p, t in sorted(_fallback_theme_name.items())])
+
+    return _fingerprints.put(current, hashlib.sha1(data.encode()).hexdigest())
+
+
+def load_timings() -> Dict[str, dict]:
+    """Get durations of load phases of themes loaded by current process
+    """
+    return {k: v.timings for k, v in _fallback_theme_name.items() if v.is_loaded}
+
+
+def cache_stats() -> dict:
+    """Get statistics of the theming caches
+    """
+    r = _cache.stats()
+    r['locations'] = {'size': sum(len(v) for v in _locations.values()), 'max_size': _locations_max_size}
+
+    return r
+
+
+def _hot_switch(package_name: str):
+    """Switch current theme without application reload
+    """
+    global _loaded
+
+    with _switch_lock:
+        theme = get(package_name)
+
+        # Preload the theme while requests are still being served by the current one
+        if not theme.is_loaded:
+            compiled = reg.get('theme.compiled')
+            reg.put('theme.compiled', False)
+            try:
+                theme.load()
+            except Exception:
+                # Current theme's assets are still in place
+                reg.put('theme.compiled', compiled)
+                raise
+
+        _loaded = theme
+        _clear_caches()
+
+    logger.info("Theme '{}' has been hot switched".format(package_name))
+
+
+def sync_hot_switch():
+    """Catch up with a theme which has been hot switched by another process
+    """
+    global _synced_at, _failed_sync
+
+    now = monotonic()
+    if not _loaded or now - _synced_at < reg.get('theme.hot_switch_sync_interval', 5):
+        return
+
+    _synced_at = now
+    current = reg.get('theme.current')
+    if current and current != _loaded.package_name and current != _failed_sync and current in _fallback_theme_name:
+        try:
+            _hot_switch(current)
+        except Exception as e:
+            # Requests are still served by the current theme, the failed one is not retried until next switch
+            _failed_sync = current
+            logger.error("Theme '{}' cannot be hot switched: {}".format(current, e), exc_info=e)
+
+
+def switch(package_name: str, hot: bool = None):
     """Switch current theme
     """
     if package_name not in _fallback_theme_name:
         raise _error.ThemeNotRegistered(package_name)
 
-    # Switch only if it really necessary
-    if package_name != get().package_name:
-        reg.put('theme.current', package_name)  # Mark theme as current
-        reg.put('theme.compiled', False)  # Mark that assets compilation needed
-        reload.reload()
+    if hot is None:
+        hot = reg.get('theme.hot_switch', False)
+
+    # Switch only if it really necessary. Theme selected for current request is not taken into account here.
+    if package_name != (_loaded or _default).package_name:
+        if hot:
+            # Theme is marked as current only after it has been loaded, so other processes never switch to a broken one
+            _hot_switch(package_name)
+            reg.put('theme.current', package_name)
+        else:
+            reg.put('theme.current', package_name)  # Mark theme as current
+            reg.put('theme.compiled', False)  # Mark that assets compilation needed
+            _clear_caches()
+            reload.reload()
 
 
-def register(package_name: str) -> _theme.Theme:
+def register(package_name: str, metadata: dict = None) -> _theme.Theme:
     """Register a theme
     """
     global _default
@@ -96,12 +315,17 @@ def register(package_name: str) -> _theme.Theme:
     if package_name in _fallback_theme_name:
         raise _error.ThemeAlreadyRegistered(package_name)
 
-    theme = _theme.Theme(package_name)
+    theme = _theme.Theme(package_name, metadata)
+
+    # Metadata which is not taken from the index must be checked before registration
+    if metadata is None:
+        theme.load_metadata()
 
     if not _default or theme.package_name == reg.get('theme.current'):
         _default = theme
 
     _fallback_theme_name[package_name] = theme
+    _fingerprints.clear()
 
     return theme
 
@@ -125,56 +349,35 @@ def load(package_name: str = None) -> _theme.Theme:
     # Load theme
     _loaded = get(package_name).load()
 
+    # Locations resolved before loading may point to another theme
+    _clear_caches()
+
     return _loaded
 
 
-def install(archive_path: str, delete_zip_file: bool = True):
+def install(archive_path: str, delete_zip_file: bool = True, progress: Callable[[str], None] = None,
+            reload_app: bool = True):
     """Install a theme from a zip-file
     """
-    logger.debug('Requested theme installation from zip-file {}'.format(archive_path))
-
-    # Create temporary directory
-    tmp_dir_path = util.mk_tmp_dir(subdir='theme')
+    from . import _install
 
-    try:
-        # Extract archive to the temporary directory
-        _extract_archive(archive_path, tmp_dir_path)
-
-        # Try to initialize the theme to ensure everything is okay
-        theme = _theme.Theme('tmp.theme.{}'.format(path.basename(tmp_dir_path)))
-
-        # Install required pip packages
-        for pkg_name, pkg_version in theme.requires['packages'].items():
-            logger.info("Theme '{}' requires pip package '{} {}', going to install it".
-                        format(theme.name, pkg_name, pkg_name, pkg_version))
-            pip.install(pkg_name, pkg_version, True, reg.get('debug'))
+    _install.install(archive_path, delete_zip_file, progress, reload_app)
 
-        # Install required plugins
-        for p_name, p_version in theme.requires['plugins'].items():
-            if not plugman.is_installed(p_name, VersionRange(p_version)):
-                logger.info("Theme '{}' requires plugin '{}', installing...".format(theme.name, p_name, p_version))
-                plugman.install(p_name, VersionRange(p_version))
 
-        # Theme has been successfully initialized, so now it can be moved to the 'themes' package
-        dst_path = path.join(_themes_path, theme.name)
-        if path.exists(dst_path):
-            logger.warn("Existing theme installation at '{}' will be replaced with new one".format(dst_path))
-            rmtree(dst_path)
+def install_async(archive_path: str, delete_zip_file: bool = True) -> str:
+    """Install a theme from a zip-file in background and get job's UID
+    """
+    from . import _install
 
-        # Move directory to the final location
-        move(tmp_dir_path, dst_path)
-        logger.debug("'{}' has been successfully moved to '{}'".format(tmp_dir_path, dst_path))
+    return _install.install_async(archive_path, delete_zip_file)
 
-        reload.reload()
 
-    finally:
-        # Remove temporary directory
-        if path.exists(tmp_dir_path):
-            rmtree(tmp_dir_path)
+def get_job(uid: str) -> dict:
+    """Get state of a background job
+    """
+    from . import _jobs
 
-        # Remove ZIP file
-        if delete_zip_file:
-            unlink(archive_path)
+    return _jobs.get(uid)
 
 
 def uninstall(package_name: str):
@@ -182,10 +385,13 @@ def uninstall(package_name: str):
     """
     theme = get(package_name)
 
-    if theme.name == get().name:
+    if theme is (_loaded or _default) or package_name in _preloaded:
         raise RuntimeError('Cannot uninstall current theme, please switch to another theme before uninstallation')
 
+    from shutil import rmtree
+
     del _fallback_theme_name[package_name]
     rmtree(theme.path)
+    _clear_caches()
 
     logger.info("Theme '{}' has been successfully uninstalled from '{}'".format(theme.name, theme.path))
@@ -0,0 +1,234 @@
+"""PytSite Theme Assets Build Cache
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import hashlib
+from typing import Optional
+from os import path, walk, listdir, makedirs, rename, replace, getpid, utime
+from shutil import rmtree, copytree
+from time import sleep, monotonic
+from pytsite import reg, logger, package_info, plugman
+from . import _api, _error, _manifest
+
+_BUILD_CACHE_DIR = path.join(_api.storage_path(), 'builds')
+
+# Files which define npm packages used by assets build
+_NPM_FILES = ('package.json', 'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock',
+              path.join('node_modules', '.package-lock.json'))
+
+
+def _cache_path(package_name: str, digest: str = None) -> str:
+    return path.join(_BUILD_CACHE_DIR, package_name, digest) if digest else path.join(_BUILD_CACHE_DIR, package_name)
+
+
+def _hash_file(h, f_path: str):
+    with open(f_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+
+
+def assets_digest(package_name: str, theme_path: str) -> str:
+    """Get content hash of theme's assets and build inputs
+    """
+    h = hashlib.sha256()
+
+    # Build settings
+    h.update('pytsite={};debug={};manifest={};compress={}\n'.format(
+        package_info.version('pytsite'), reg.get('debug'), reg.get('theme.assets_manifest', True),
+        reg.get('theme.assets_compress', True)).encode())
+
+    # Assets of plugins, including assetman itself, can be used by theme's assets
+    for p_name, p_info in sorted(plugman.local_plugins_info().items()):
+        h.update('{}={}\n'.format(p_name, p_info['version']).encode())
+
+    # Definitions of npm packages used by the build, including ones which are actually installed
+    for root in (reg.get('paths.root'), theme_path):
+        for f_name in _NPM_FILES:
+            f_path = path.join(root, f_name)
+            h.update(f_path.encode() + b'\0')
+            if path.isfile(f_path):
+                _hash_file(h, f_path)
+            h.update(b'\0')
+
+    # Assets sources
+    assets_path = path.join(theme_path, 'res', 'assets')
+    for root, dirs, files in walk(assets_path):
+        dirs[:] = sorted(d for d in dirs if d != 'node_modules')
+        for f_name in sorted(files):
+            f_path = path.join(root, f_name)
+            h.update(path.relpath(f_path, assets_path).encode() + b'\0')
+            _hash_file(h, f_path)
+            h.update(b'\0')
+
+    return h.hexdigest()
+
+
+def restore(package_name: str, digest: str) -> bool:
+    """Restore previously built assets
+    """
+    from plugins import assetman
+
+    src = _cache_path(package_name, digest)
+    if not path.isdir(src):
+        return False
+
+    # Copy to temporary location first, so assets being served are never partially written
+    dst = assetman.assets_dst(package_name)
+    tmp_dst = '{}.{}.tmp'.format(dst, getpid())
+    copytree(src, tmp_dst)
+    if path.exists(dst):
+        old_dst = '{}.{}.old'.format(dst, getpid())
+        rename(dst, old_dst)
+        rename(tmp_dst, dst)
+        rmtree(old_dst, True)
+    else:
+        rename(tmp_dst, dst)
+
+    # Mark the build as recently used, so it will not be removed as an old one
+    utime(src)
+
+    logger.debug("Assets of theme '{}' restored from build cache '{}'".format(package_name, src))
+
+    return True
+
+
+def store(package_name: str, digest: str):
+    """Store built assets to the cache
+    """
+    from plugins import assetman
+
+    src = assetman.assets_dst(package_name)
+    dst = _cache_path(package_name, digest)
+    if not path.isdir(src) or path.exists(dst):
+        return
+
+    # Copy to temporary location first to not leave partially copied build in case of error
+    tmp_dst = '{}.{}.tmp'.format(dst, getpid())
+    copytree(src, tmp_dst)
+    try:
+        rename(tmp_dst, dst)
+    except OSError:
+        # Same build has been stored by another process
+        rmtree(tmp_dst, True)
+        return
+
+    # Remove oldest builds
+    builds = sorted((path.join(_cache_path(package_name), d) for d in listdir(_cache_path(package_name))
+                     if not d.endswith('.tmp')), key=path.getmtime)
+    for b_path in builds[:-reg.get('theme.build_cache_size', 3)]:
+        rmtree(b_path, True)
+
+    logger.debug("Assets of theme '{}' stored to build cache '{}'".format(package_name, dst))
+
+
+def _current_path(package_name: str) -> str:
+    return path.join(_BUILD_CACHE_DIR, package_name + '.current')
+
+
+def _read_current(package_name: str) -> Optional[str]:
+    """Get digest of assets which are currently built
+    """
+    try:
+        with open(_current_path(package_name)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _write_current(package_name: str, digest: str):
+    c_path = _current_path(package_name)
+    tmp_path = '{}.{}'.format(c_path, getpid())
+    with open(tmp_path, 'wt') as f:
+        f.write(digest)
+    replace(tmp_path, c_path)
+
+
+def is_up_to_date(package_name: str, theme_path: str) -> bool:
+    """Check if theme's assets are built from their current sources
+    """
+    from plugins import assetman
+
+    current = _read_current(package_name)
+
+    return bool(current) and path.isdir(assetman.assets_dst(package_name)) and \
+        current == assets_digest(package_name, theme_path)
+
+
+def _lock(lock_file, timeout: float) -> bool:
+    """Acquire an exclusive lock on a file, waiting up to timeout seconds
+    """
+    import fcntl
+
+    deadline = monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if monotonic() >= deadline:
+                return False
+            sleep(0.1)
+
+
+def _build(package_name: str, theme_path: str, digest: str, setup: bool):
+    from plugins import assetman
+
+    if restore(package_name, digest):
+        _manifest.reset(package_name)
+        return
+
+    if setup:
+        assetman.setup()
+    assetman.build(package_name)
+
+    # Content hashed copies and compressed variants are stored to the build cache along with built assets
+    if reg.get('theme.assets_manifest', True):
+        _manifest.build(package_name)
+
+    makedirs(_cache_path(package_name), 0o755, True)
+    store(package_name, digest)
+
+
+def build(package_name: str, theme_path: str, setup: bool = True):
+    """Build theme's assets or restore them from the cache
+
+    Only one process builds assets of a theme at a time. Other processes wait for the build to complete or, if they
+    cannot wait, keep serving the last good build.
+    """
+    from plugins import assetman
+
+    digest = assets_digest(package_name, theme_path)
+    has_last_build = path.isdir(assetman.assets_dst(package_name)) and _read_current(package_name) is not None
+    timeout = reg.get('theme.build_lock_timeout', 300) if reg.get('theme.build_wait', True) or not has_last_build else 0
+
+    # Lock is released when the file is closed, including when the process dies
+    makedirs(_BUILD_CACHE_DIR, 0o755, True)
+    with open(path.join(_BUILD_CACHE_DIR, package_name + '.lock'), 'a') as lock_file:
+        t_start = monotonic()
+        locked = _lock(lock_file, timeout)
+        waited = monotonic() - t_start
+
+        if not locked:
+            if not has_last_build:
+                raise _error.ThemeLoadError("Assets of theme '{}' are not built by another process in {:.3f}s".
+                                            format(package_name, waited))
+
+            logger.warn("Assets of theme '{}' are being built by another process, last good build is used".
+                        format(package_name))
+            return
+
+        if waited >= 0.1:
+            logger.info("Waited {:.3f}s for assets build lock of theme '{}'".format(waited, package_name))
+
+        # Assets may have been built by another process while waiting for the lock
+        if _read_current(package_name) == digest and path.isdir(assetman.assets_dst(package_name)):
+            logger.debug("Assets of theme '{}' are up to date".format(package_name))
+            return
+
+        t_start = monotonic()
+        _build(package_name, theme_path, digest, setup)
+        _write_current(package_name, digest)
+
+        logger.info("Assets of theme '{}' built in {:.3f}s".format(package_name, monotonic() - t_start))
@@ -0,0 +1,130 @@
+"""PytSite Theme Caches
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+from typing import Any, Dict, Hashable
+from collections import OrderedDict
+from threading import RLock
+from time import monotonic
+
+_pools = {}  # type: Dict[str, Pool]
+
+
+class Pool:
+    """Bounded in-process LRU cache pool
+    """
+
+    def __init__(self, uid: str, max_size: int = 1024, ttl: float = 0):
+        """Init
+        """
+        self._uid = uid
+        self._max_size = max_size
+        self._ttl = ttl
+        self._items = OrderedDict()
+        self._lock = RLock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def uid(self) -> str:
+        return self._uid
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
+
+    def get(self, key: Hashable) -> Any:
+        """Get an item, raise KeyError if it is not cached
+        """
+        with self._lock:
+            try:
+                value, expires = self._items[key]
+            except KeyError:
+                self._misses += 1
+                raise
+
+            # Other processes may change the source of an item, so it can be held for a limited time only
+            if expires and expires < monotonic():
+                del self._items[key]
+                self._misses += 1
+                raise KeyError(key)
+
+            self._items.move_to_end(key)
+            self._hits += 1
+
+            return value
+
+    def put(self, key: Hashable, value: Any) -> Any:
+        """Put an item, evict least recently used ones if the pool is full
+        """
+        with self._lock:
+            self._items[key] = (value, monotonic() + self._ttl if self._ttl else 0)
+            self._items.move_to_end(key)
+
+            while len(self._items) > self._max_size:
+                self._items.popitem(False)
+
+        return value
+
+    def rm(self, key: Hashable):
+        """Remove an item
+        """
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        """Remove all items
+        """
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        """Get pool's statistics
+        """
+        with self._lock:
+            return {
+                'size': len(self._items),
+                'max_size': self._max_size,
+                'ttl': self._ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+
+
+def create_pool(uid: str, max_size: int = 1024, ttl: float = 0) -> Pool:
+    """Create a cache pool
+    """
+    if uid in _pools:
+        raise KeyError("Cache pool '{}' is already created".format(uid))
+
+    _pools[uid] = Pool(uid, max_size, ttl)
+
+    return _pools[uid]
+
+
+def get_pool(uid: str) -> Pool:
+    """Get a cache pool
+    """
+    try:
+        return _pools[uid]
+    except KeyError:
+        raise KeyError("Cache pool '{}' is not created".format(uid))
+
+
+def clear(uid: str = None):
+    """Clear a cache pool or all of them
+    """
+    for pool in ([get_pool(uid)] if uid else _pools.values()):
+        pool.clear()
+
+
+def stats() -> Dict[str, dict]:
+    """Get statistics of all cache pools
+    """
+    return {uid: pool.stats() for uid, pool in _pools.items()}
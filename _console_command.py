@@ -0,0 +1,45 @@
+"""PytSite Theming Console Commands
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+from pytsite import console, lang
+from . import _api
+
+
+class Timings(console.Command):
+    """'theming:timings' Console Command
+    """
+
+    @property
+    def name(self) -> str:
+        """Get name of the command.
+        """
+        return 'theming:timings'
+
+    @property
+    def description(self) -> str:
+        """Get description of the command.
+        """
+        return 'theming@timings_console_command_description'
+
+    def exec(self):
+        """Execute the command.
+        """
+        timings = _api.load_timings()
+
+        # Theme is not loaded in management mode
+        if not timings:
+            _api.load()
+            timings = _api.load_timings()
+
+        for package_name, t in timings.items():
+            total = '{:.4f}'.format(t['total'])
+            console.print_info(lang.t('theming@theme_load_timings', {'name': package_name, 'total': total}))
+            for phase in t['phases']:
+                console.print_normal('  {:<16}{:.4f}'.format(phase['name'], phase['duration']))
+                for item, duration in phase['items'].items():
+                    console.print_normal('    {:<30}{:.4f}'.format(item, duration))
+            if t['skipped']:
+                console.print_normal('  ' + lang.t('theming@theme_load_skipped', {'checks': ', '.join(t['skipped'])}))
@@ -4,9 +4,17 @@ __author__ = 'Oleksandr Shepetko'
 __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
-from pytsite import metatag, reg, plugman
+from typing import List
+from pytsite import metatag, reg, plugman, router
 from plugins import assetman, file
-from . import _api
+from . import _api, _cache, _selector, _manifest, _images
+
+_HOT_SWITCH = reg.get('theme.hot_switch', False)
+_MULTI_THEME = reg.get('theme.multi', False)
+_ASSETS_MANIFEST = reg.get('theme.assets_manifest', True)
+
+# Favicon link attributes per theme
+_favicons = _cache.create_pool('favicons', 16, reg.get('theme.favicon_cache_ttl', 60))
 
 
 def on_app_load():
@@ -14,52 +22,82 @@ def on_app_load():
     if not plugman.is_management_mode():
         _api.load()
 
-def on_router_dispatch():
-    """pytsite.router.dispatch
+        # Load themes which can be selected per request
+        if _MULTI_THEME:
+            package_names = list(reg.get('theme.multi_themes', []))
+            package_names += [r['theme'] for r in _selector.rules() if r.get('theme')]
+            _api.preload(sorted(set(package_names)))
+
+        # Apply changes of loaded themes' resources without application reload
+        if reg.get('theme.watch', False):
+            from . import _watch
+            _watch.start(t for t in _api.get_all().values() if t.is_loaded)
+
+
+def on_router_pre_dispatch():
+    """pytsite.router.pre_dispatch
     """
-    if not assetman.is_package_registered(_api.get().package_name):
-        return
+    _api.set_request_theme(_selector.select(router.request()))
 
-    # Set current theme package
-    metatag.t_set('pytsite-theme', _api.get().package_name)
 
-    # Set favicon URL
+def _get_favicon_links(package_name: str) -> List[dict]:
+    """Get favicon links attributes
+    """
+    try:
+        return _favicons.get(package_name)
+    except KeyError:
+        pass
+
+    links = []
     favicon_fid = reg.get('theme.favicon')
     if favicon_fid:
-        try:
-            f = file.get(favicon_fid)
-            metatag.t_set('link', rel='icon', type=f.mime, href=f.get_url(width=50, height=50))
-        except file.error.FileNotFound:
-            pass
+        # Derivatives generated when settings were saved
+        favicon = _images.get('theme.favicon', 50, 50)
+        if favicon:
+            links.append({'rel': 'icon', 'type': favicon['mime'], 'href': favicon['url']})
+            touch_icon = _images.get('theme.favicon', 180, 180)
+            if touch_icon:
+                links.append({'rel': 'apple-touch-icon', 'sizes': '180x180', 'href': touch_icon['url']})
+        else:
+            try:
+                f = file.get(favicon_fid)
+                links.append({'rel': 'icon', 'type': f.mime, 'href': f.get_url(width=50, height=50)})
+            except file.error.FileNotFound:
+                pass
     else:
-        metatag.t_set('link', rel='icon', type='image/png', href=assetman.url('$theme@img/favicon.png'))
+        links.append({'rel': 'icon', 'type': 'image/png', 'href': assetman.url('$theme@img/favicon.png')})
 
+    return _favicons.put(package_name, links)
 
-def on_lang_split_msg_id(msg_id: str):
-    if '@' not in msg_id:
-        msg_id = '$theme@' + msg_id
 
-    if '$theme' in msg_id:
-        msg_id = msg_id.replace('$theme', _api.get().package_name)
+def on_router_dispatch():
+    """pytsite.router.dispatch
+    """
+    if _HOT_SWITCH:
+        _api.sync_hot_switch()
 
-    return msg_id
+    package_name = _api.get().package_name
+    if not assetman.is_package_registered(package_name):
+        return
 
+    # Set current theme package
+    metatag.t_set('pytsite-theme', package_name)
 
-def on_tpl_resolve_location(location: str) -> str:
-    if '@' not in location:
-        location = '$theme@' + location
+    # Set favicon URLs
+    for favicon_link in _get_favicon_links(package_name):
+        metatag.t_set('link', **favicon_link)
 
-    if '$theme' in location:
-        location = location.replace('$theme', _api.get().package_name)
 
-    return location
+def on_lang_split_msg_id(msg_id: str):
+    return _api.resolve_location(msg_id)
 
 
-def on_assetman_split_location(location: str):
-    if '@' not in location:
-        location = '$theme@' + location
+def on_tpl_resolve_location(location: str) -> str:
+    return _api.resolve_location(location)
 
-    if '$theme' in location:
-        location = location.replace('$theme', _api.get().package_name)
 
-    return location
+def on_assetman_split_location(location: str):
+    location = _api.resolve_location(location)
+
+    # Content hashed copies of theme's assets can be cached by browsers forever
+    return _manifest.resolve(location) if _ASSETS_MANIFEST else location
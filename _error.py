@@ -13,6 +13,14 @@ class ThemeLoadError(Exception):
     pass
 
 
+class ThemeArchiveError(Exception):
+    pass
+
+
+class ThemeUploadError(Exception):
+    pass
+
+
 class NoThemesFound(Exception):
     def __init__(self, themes_dir: str):
         self._dir = themes_dir
@@ -40,3 +48,30 @@ class ThemeAlreadyRegistered(Exception):
 
     def __str__(self):
         return "Theme '{}' is already registered".format(self._theme_name)
+
+
+class ThemeJobsQueueFull(Exception):
+    def __str__(self):
+        return 'Theme jobs queue is full, please try again later'
+
+
+class ThemeJobNotFound(Exception):
+    def __init__(self, uid: str):
+        self._uid = uid
+
+    def __str__(self):
+        return "Theme job '{}' is not found".format(self._uid)
+
+
+class ThemeRequirementsConflict(Exception):
+    def __init__(self, conflicts: dict):
+        self._conflicts = conflicts
+
+    @property
+    def conflicts(self) -> dict:
+        return self._conflicts
+
+    def __str__(self):
+        return 'Themes have conflicting requirements: {}'.format('; '.join(
+            "'{}' ({})".format(r_name, ', '.join(str(r) for r in ranges))
+            for r_name, ranges in sorted(self._conflicts.items())))
@@ -4,11 +4,13 @@ __author__ = 'Oleksandr Shepetko'
 __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
+import json
+import hashlib
 from os import close as os_close
 from werkzeug.datastructures import FileStorage
 from pytsite import routing, lang, http, util
-from plugins import auth
-from . import _api
+from plugins import auth, http_api
+from . import _api, _error
 
 
 class Install(routing.Controller):
@@ -16,6 +18,11 @@ class Install(routing.Controller):
         if not auth.get_current_user().is_admin:
             raise self.forbidden()
 
+        # Chunked upload
+        action = self.arg('action')
+        if action:
+            return self._exec_chunked(action)
+
         file = self.args.pop('file')  # type: FileStorage
 
         if not file:
@@ -33,22 +40,111 @@ class Install(routing.Controller):
         file.save(tmp_file_path)
         os_close(tmp_file_id)
 
-        # Install theme from ZIP file
+        return self._install(tmp_file_path)
+
+    def _exec_chunked(self, action: str):
+        """Handle chunked upload: init, status, chunk, finalize or abort
+        """
+        from . import _upload
+
+        upload_id = self.arg('upload_id', '')
+
+        try:
+            if action == 'init':
+                return _upload.init(int(self.arg('size', 0)), self.arg('checksum'))
+
+            elif action == 'status':
+                return _upload.status(upload_id)
+
+            elif action == 'chunk':
+                chunk = self.args.pop('chunk', None)  # type: FileStorage
+                if not chunk:
+                    raise _error.ThemeUploadError('Chunk is not provided')
+
+                return _upload.append(upload_id, int(self.arg('offset', -1)), chunk.read(), self.arg('checksum'))
+
+            elif action == 'abort':
+                _upload.abort(upload_id)
+                return {'status': True}
+
+            elif action == 'finalize':
+                file_path = _upload.finalize(upload_id)
+
+            else:
+                raise _error.ThemeUploadError("Unknown action '{}'".format(action))
+
+        except (_error.ThemeUploadError, ValueError) as e:
+            self.args.update({'error': lang.t('theming@theme_installation_failed', {'msg': str(e)})})
+            raise self.server_error(response=http.JSONResponse(dict(self.args)))
+
+        return self._install(file_path)
+
+    def _install(self, file_path: str):
+        """Install theme from ZIP file in background
+        """
         try:
-            _api.install(tmp_file_path)
+            job_uid = _api.install_async(file_path)
         except Exception as e:
             self.args.update({'error': lang.t('theming@theme_installation_failed', {'msg': str(e)})})
             raise self.server_error(response=http.JSONResponse(dict(self.args)))
 
         # It is important to return all input arguments back (except file, of course)
         self.args.update({
+            'job_uid': job_uid,
             'message': lang.t('theming@wait_theme_being_installed'),
-            'eval': 'setTimeout(function() {window.location.reload()}, 3000)',
+            'eval': 'pytsiteThemingWaitJob({})'.format(json.dumps(http_api.endpoint('theming@get_job', {
+                'uid': job_uid
+            }))),
         })
 
         return self.args
 
 
+class Get(routing.Controller):
+    _FIELDS = ('package_name', 'name', 'version', 'description', 'author', 'url', 'requires')
+
+    def exec(self):
+        if not auth.get_current_user().is_admin:
+            raise self.forbidden()
+
+        try:
+            offset = max(int(self.arg('offset', 0)), 0)
+            limit = min(max(int(self.arg('limit', 100)), 1), 1000)
+        except ValueError:
+            raise self.server_error(response=http.JSONResponse({'error': 'Invalid offset or limit'}))
+
+        fields = self.arg('fields') or self._FIELDS
+        if isinstance(fields, str):
+            fields = fields.split(',')
+        fields = [f for f in self._FIELDS if f in fields]
+
+        # Response depends only on registered themes, current theme and request arguments
+        etag_data = '{}:{}:{}:{}'.format(_api.fingerprint(), offset, limit, ','.join(fields))
+        etag = hashlib.sha1(etag_data.encode()).hexdigest()
+        if self.request.if_none_match.contains(etag):
+            response = http.Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        themes = list(_api.get_all().values())
+        items = []
+        for theme in themes[offset:offset + limit]:
+            metadata = theme.metadata
+            metadata['package_name'] = theme.package_name
+            items.append({f: metadata[f] for f in fields})
+
+        response = http.JSONResponse({
+            'current': _api.get().package_name,
+            'total': len(themes),
+            'offset': offset,
+            'limit': limit,
+            'items': items,
+        })
+        response.set_etag(etag)
+
+        return response
+
+
 class Switch(routing.Controller):
     def exec(self):
         if not auth.get_current_user().is_admin:
@@ -67,3 +163,22 @@ class Uninstall(routing.Controller):
         _api.uninstall(self.arg('package_name'))
 
         return {'status': True}
+
+
+class GetJob(routing.Controller):
+    def exec(self):
+        if not auth.get_current_user().is_admin:
+            raise self.forbidden()
+
+        try:
+            return _api.get_job(self.arg('uid'))
+        except _error.ThemeJobNotFound as e:
+            raise self.not_found(e)
+
+
+class GetTimings(routing.Controller):
+    def exec(self):
+        if not auth.get_current_user().is_admin:
+            raise self.forbidden()
+
+        return _api.load_timings()
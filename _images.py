@@ -0,0 +1,158 @@
+"""PytSite Theme Image Derivatives
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import json
+from typing import Callable, Dict, List, Optional
+from os import path, makedirs, replace, getpid
+from pytsite import reg, logger
+from . import _cache
+
+# Image settings and sizes of their derivatives, which are generated by default
+_DEFAULT_SIZES = {
+    'theme.logo': [[0, 0]],
+    'theme.logo_footer': [[0, 0]],
+    # Favicons, Apple touch icon and Android icons
+    'theme.favicon': [[16, 16], [32, 32], [50, 50], [180, 180], [192, 192], [512, 512]],
+}
+
+# Precomputed derivatives table
+_table = None  # type: Dict[str, dict]
+
+
+def _table_path() -> str:
+    from . import _api
+
+    return path.join(_api.storage_path(), 'images.json')
+
+
+def _key(width: int, height: int, enlarge: bool) -> str:
+    return '{}x{}{}'.format(width, height, '+' if enlarge else '')
+
+
+def sizes() -> Dict[str, List[List[int]]]:
+    """Get sizes of image derivatives per setting
+
+    Sizes can be extended by 'theme.image_sizes' registry key, which has same structure as the default sizes.
+    """
+    r = {k: list(v) for k, v in _DEFAULT_SIZES.items()}
+    for setting, setting_sizes in reg.get('theme.image_sizes', {}).items():
+        r.setdefault(setting, [])
+        r[setting] += [list(s) for s in setting_sizes if list(s) not in r[setting]]
+
+    return r
+
+
+def _read() -> Dict[str, dict]:
+    try:
+        with open(_table_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(table: Dict[str, dict]):
+    t_path = _table_path()
+    makedirs(path.dirname(t_path), 0o755, True)
+
+    # Table is read by all application processes, so replace it atomically
+    tmp_path = '{}.{}'.format(t_path, getpid())
+    with open(tmp_path, 'wt') as f:
+        json.dump(table, f)
+    replace(tmp_path, t_path)
+
+
+def _warm(url: str):
+    """Request an image URL, so the image gets resized before the first viewer requests it
+    """
+    from urllib.request import urlopen
+
+    if not url.startswith(('http://', 'https://')):
+        return
+
+    try:
+        with urlopen(url, timeout=reg.get('theme.image_warm_timeout', 30)) as r:
+            r.read()
+    except Exception as e:
+        logger.warn("Image derivative '{}' cannot be warmed up: {}".format(url, e))
+
+
+def generate(progress: Callable[[str], None] = None):
+    """Generate derivatives of images stored in settings
+    """
+    global _table
+
+    from plugins import file
+
+    warm = reg.get('theme.image_warm', True)
+    table = {}
+
+    for setting, setting_sizes in sorted(sizes().items()):
+        fid = reg.get(setting)
+        if not fid:
+            continue
+
+        if progress:
+            progress(setting)
+
+        try:
+            f = file.get(fid)
+        except file.error.FileNotFound:
+            logger.warn("Image '{}' stored in '{}' is not found".format(fid, setting))
+            continue
+
+        urls = {}
+        for width, height in setting_sizes:
+            url = urls[_key(width, height, False)] = f.get_url(width=width, height=height)
+            if warm and (width or height):
+                _warm(url)
+
+        table[setting] = {'fid': fid, 'mime': f.mime, 'urls': urls}
+
+    _write(table)
+    _table = table
+
+    # URLs resolved before generation may be incomplete
+    _cache.clear('favicons')
+    _cache.clear('logos')
+
+    logger.debug('Image derivatives generated: {}'.format(', '.join(
+        '{} ({})'.format(k, len(v['urls'])) for k, v in sorted(table.items()))))
+
+
+def generate_async() -> Optional[str]:
+    """Generate derivatives of images stored in settings in background and get job's UID
+    """
+    from . import _jobs, _error
+
+    try:
+        return _jobs.submit('images', generate)
+    except _error.ThemeJobsQueueFull as e:
+        # Derivatives will be generated on first request as usual
+        logger.warn(e)
+
+
+def get(setting: str, width: int = 0, height: int = 0, enlarge: bool = False) -> Optional[dict]:
+    """Get precomputed derivative of an image stored in a setting
+
+    Returns dict with keys 'url' and 'mime' or None, if the derivative has not been generated.
+    """
+    global _table
+
+    fid = reg.get(setting)
+    if not fid:
+        return None
+
+    # Table may have been updated by another process
+    if _table is None or _table.get(setting, {}).get('fid') != fid:
+        _table = _read()
+
+    entry = _table.get(setting)
+    if not entry or entry['fid'] != fid:
+        return None
+
+    url = entry['urls'].get(_key(width, height, enlarge))
+
+    return {'url': url, 'mime': entry['mime']} if url else None
@@ -0,0 +1,83 @@
+"""PytSite Theme Metadata Index
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import json
+from typing import Dict, Iterable, List, Optional
+from os import path, makedirs, replace, stat, getpid
+from pytsite import lang, logger
+from . import _api, _theme
+
+_INDEX_VERSION = 2
+
+_index_path = path.join(_api.storage_path(), 'index.json')
+
+
+def _fingerprint(theme_path: str) -> Optional[List[int]]:
+    """Get fingerprint of a theme's directory
+    """
+    try:
+        d_stat = stat(theme_path)
+        j_stat = stat(path.join(theme_path, 'theme.json'))
+    except OSError:
+        return None
+
+    return [d_stat.st_mtime_ns, j_stat.st_mtime_ns, j_stat.st_size]
+
+
+def _read() -> dict:
+    """Read index file
+    """
+    try:
+        with open(_index_path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if data.get('version') != _INDEX_VERSION or data.get('langs') != lang.langs():
+        return {}
+
+    return data.get('themes', {})
+
+
+def load(themes_dir: str) -> Dict[str, dict]:
+    """Get metadata of themes which have not been changed since last indexing
+    """
+    r = {}
+
+    for name, item in _read().items():
+        fingerprint = _fingerprint(path.join(themes_dir, name))
+        if fingerprint and fingerprint == item['fingerprint']:
+            r[name] = item['metadata']
+        else:
+            logger.debug("Theme '{}' has been changed since last indexing".format(name))
+
+    return r
+
+
+def save(themes_dir: str, themes: Iterable[_theme.Theme]):
+    """Write metadata of themes to the index
+    """
+    items = {}
+    for theme in themes:
+        theme_dir = path.basename(theme.path)
+        fingerprint = _fingerprint(path.join(themes_dir, theme_dir))
+        if fingerprint:
+            items[theme_dir] = {'fingerprint': fingerprint, 'metadata': theme.metadata}
+
+    if items == _read():
+        return
+
+    index_dir = path.dirname(_index_path)
+    if not path.isdir(index_dir):
+        makedirs(index_dir, 0o755, True)
+
+    # Several processes may write the index simultaneously, so replace it atomically
+    tmp_path = '{}.{}'.format(_index_path, getpid())
+    with open(tmp_path, 'wt') as f:
+        json.dump({'version': _INDEX_VERSION, 'langs': lang.langs(), 'themes': items}, f)
+    replace(tmp_path, _index_path)
+
+    logger.debug("Themes metadata index updated at '{}'".format(_index_path))
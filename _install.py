@@ -0,0 +1,145 @@
+"""PytSite Theme Installation
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+from typing import Callable
+from os import path, unlink, makedirs
+from shutil import rmtree, move
+from zipfile import ZipFile
+from pytsite import reg, logger, util, reload, plugman, pip
+from . import _api, _theme, _error, _jobs, _requirements
+
+
+def _no_progress(phase: str):
+    pass
+
+
+def _extract_archive(src_file_path: str, dst_dir_path: str):
+    """Extract theme archive
+    """
+    max_files = reg.get('theme.archive_max_files', 10000)
+    max_size = reg.get('theme.archive_max_size', 536870912)
+
+    with ZipFile(src_file_path) as z_file:
+        entries = z_file.infolist()
+
+        if len(entries) > max_files:
+            raise _error.ThemeArchiveError('Archive contains more than {} entries'.format(max_files))
+
+        # Protect against entries pointing outside of the destination directory
+        for entry in entries:
+            if entry.filename.startswith('/') or '..' in entry.filename.split('/') or '\\' in entry.filename:
+                raise _error.ThemeArchiveError("Archive contains invalid entry '{}'".format(entry.filename))
+
+        # If the archive contains only single directory, its files should be extracted up
+        prefix = ''
+        top_names = {e.filename.split('/')[0] for e in entries}
+        if len(top_names) == 1 and all('/' in e.filename for e in entries):
+            prefix = top_names.pop() + '/'
+
+        total_size = 0
+        for entry in entries:
+            f_name = entry.filename[len(prefix):]
+            if not f_name:
+                continue
+
+            f_path = path.join(dst_dir_path, *f_name.split('/'))
+            if entry.is_dir():
+                makedirs(f_path, 0o755, True)
+                continue
+
+            makedirs(path.dirname(f_path), 0o755, True)
+            with z_file.open(entry) as src, open(f_path, 'wb') as dst:
+                # Declared entry sizes can be forged, so real amount of data is counted
+                for chunk in iter(lambda: src.read(65536), b''):
+                    total_size += len(chunk)
+                    if total_size > max_size:
+                        raise _error.ThemeArchiveError('Archive contents exceed {} bytes'.format(max_size))
+                    dst.write(chunk)
+
+    logger.debug("Theme files successfully extracted from file '{}' to directory '{}'".
+                 format(src_file_path, dst_dir_path))
+
+
+def install(archive_path: str, delete_zip_file: bool = True, progress: Callable[[str], None] = None,
+            reload_app: bool = True):
+    """Install a theme from a zip-file
+    """
+    logger.debug('Requested theme installation from zip-file {}'.format(archive_path))
+
+    progress = progress or _no_progress
+
+    # Create temporary directory
+    tmp_dir_path = util.mk_tmp_dir(subdir='theme')
+
+    try:
+        # Extract archive to the temporary directory
+        progress('extract')
+        _extract_archive(archive_path, tmp_dir_path)
+
+        # Try to initialize the theme to ensure everything is okay
+        theme = _theme.Theme('tmp.theme.{}'.format(path.basename(tmp_dir_path)))
+
+        # Requirements are installed only if they have been changed since previous installation
+        req_scope = 'theme:' + theme.name
+        req_miss = _requirements.resolution_miss(req_scope, theme.requires)
+        if req_miss:
+            logger.info("Requirements of theme '{}' will be installed, because {}".format(theme.name, req_miss))
+        else:
+            logger.info("Requirements of theme '{}' have not been changed since previous installation".
+                        format(theme.name))
+
+        # Install required pip packages
+        progress('pip')
+        for pkg_name, pkg_version in theme.requires['packages'].items() if req_miss else ():
+            logger.info("Theme '{}' requires pip package '{} {}', going to install it".
+                        format(theme.name, pkg_name, pkg_name, pkg_version))
+            pip.install(pkg_name, pkg_version, True, reg.get('debug'))
+
+        # Install required plugins
+        progress('plugins')
+        for p_name, p_version in theme.requires['plugins'].items() if req_miss else ():
+            if not plugman.is_installed(p_name, p_version):
+                logger.info("Theme '{}' requires plugin '{}', installing...".format(theme.name, p_name, p_version))
+                plugman.install(p_name, p_version)
+
+        if req_miss:
+            _requirements.store_resolution(req_scope, theme.requires)
+
+        # Theme has been successfully initialized, so now it can be moved to the 'themes' package
+        progress('deploy')
+        dst_path = path.join(_api.themes_path(), theme.name)
+        if path.exists(dst_path):
+            logger.warn("Existing theme installation at '{}' will be replaced with new one".format(dst_path))
+            rmtree(dst_path)
+
+        # Move directory to the final location
+        move(tmp_dir_path, dst_path)
+        logger.debug("'{}' has been successfully moved to '{}'".format(tmp_dir_path, dst_path))
+
+        if reload_app:
+            reload.reload()
+
+    finally:
+        # Remove temporary directory
+        if path.exists(tmp_dir_path):
+            rmtree(tmp_dir_path)
+
+        # Remove ZIP file
+        if delete_zip_file:
+            unlink(archive_path)
+
+
+def install_async(archive_path: str, delete_zip_file: bool = True) -> str:
+    """Install a theme from a zip-file in background and get job's UID
+    """
+
+    def target(progress: Callable[[str], None]):
+        install(archive_path, delete_zip_file, progress, False)
+
+        # Application should be reloaded only after job's final state is stored
+        return reload.reload
+
+    return _jobs.submit('install', target)
@@ -0,0 +1,156 @@
+"""PytSite Theme Background Jobs
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import json
+from typing import Callable, Optional
+from os import path, makedirs, listdir, unlink, replace, getpid, stat
+from queue import Queue, Full
+from threading import Lock
+from time import time
+from pytsite import reg, util, logger, threading
+from . import _error
+
+_JOBS_PATH = path.join(reg.get('paths.tmp'), 'theming', 'jobs')
+
+_queue = Queue(reg.get('theme.jobs_queue_size', 4))
+_worker_lock = Lock()
+_worker = None
+
+
+def _job_path(uid: str) -> str:
+    if not uid.isalnum():
+        raise _error.ThemeJobNotFound(uid)
+
+    return path.join(_JOBS_PATH, uid + '.json')
+
+
+def _write(job: dict):
+    """Store job's state
+
+    Job's state is stored in the filesystem, so it is available for all application processes.
+    """
+    j_path = _job_path(job['uid'])
+    tmp_path = '{}.{}'.format(j_path, getpid())
+    with open(tmp_path, 'wt') as f:
+        json.dump(job, f)
+    replace(tmp_path, j_path)
+
+
+def _cleanup():
+    """Remove states of old jobs
+    """
+    ttl = reg.get('theme.jobs_ttl', 86400)
+    for f_name in listdir(_JOBS_PATH):
+        f_path = path.join(_JOBS_PATH, f_name)
+        try:
+            if time() - stat(f_path).st_mtime > ttl:
+                unlink(f_path)
+        except OSError:
+            pass
+
+
+class _Progress:
+    """Job's progress tracker
+    """
+
+    def __init__(self, job: dict):
+        self._job = job
+
+    def __call__(self, phase: str):
+        """Start a new phase
+        """
+        now = time()
+        phases = self._job['phases']
+
+        if phases and phases[-1]['duration'] is None:
+            phases[-1]['duration'] = now - phases[-1]['started']
+
+        if phase:
+            phases.append({'name': phase, 'started': now, 'duration': None})
+            self._job['phase'] = phase
+
+        _write(self._job)
+
+
+def _run(job: dict, target: Callable[..., Optional[Callable[[], None]]], kwargs: dict):
+    """Run a job
+    """
+    progress = _Progress(job)
+    job['status'] = 'running'
+    progress('')
+
+    after = None
+    try:
+        after = target(progress=progress, **kwargs)
+        job['status'] = 'done'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+        logger.error(e, exc_info=e)
+
+    job['finished'] = time()
+    progress('')
+
+    # Job's final state is stored, so actions like application reload can be performed safely
+    if after:
+        after()
+
+
+def _work():
+    while True:
+        job, target, kwargs = _queue.get()
+        try:
+            _run(job, target, kwargs)
+        finally:
+            _queue.task_done()
+
+
+def submit(job_type: str, target: Callable[..., Optional[Callable[[], None]]], **kwargs) -> str:
+    """Put a job into the queue
+
+    Target is called with keyword argument 'progress', which should be called with a phase name on every phase start.
+    Target can return a callable, which will be called after storing job's final state.
+    """
+    global _worker
+
+    makedirs(_JOBS_PATH, 0o755, True)
+    _cleanup()
+
+    job = {
+        'uid': util.random_str(32),
+        'type': job_type,
+        'status': 'queued',
+        'phase': None,
+        'phases': [],
+        'error': None,
+        'created': time(),
+        'finished': None,
+    }
+    _write(job)
+
+    try:
+        _queue.put_nowait((job, target, kwargs))
+    except Full:
+        unlink(_job_path(job['uid']))
+        raise _error.ThemeJobsQueueFull()
+
+    with _worker_lock:
+        if not _worker:
+            _worker = threading.create_thread(_work)
+            _worker.daemon = True
+            _worker.start()
+
+    return job['uid']
+
+
+def get(uid: str) -> dict:
+    """Get job's state
+    """
+    try:
+        with open(_job_path(uid)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise _error.ThemeJobNotFound(uid)
@@ -0,0 +1,87 @@
+"""PytSite Theme Translations Cache
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import hashlib
+import marshal
+from typing import Optional
+from os import path, makedirs, replace, getpid, unlink
+from pytsite import lang, logger
+
+
+def _read_cache(cache_path: str, digest: str) -> Optional[dict]:
+    try:
+        with open(cache_path, 'rb') as f:
+            version, c_digest, content = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    return content if version == marshal.version and c_digest == digest else None
+
+
+def _write_cache(cache_path: str, digest: str, content: dict):
+    makedirs(path.dirname(cache_path), 0o755, True)
+
+    # Several processes may write the cache simultaneously, so replace it atomically
+    tmp_path = '{}.{}'.format(cache_path, getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            marshal.dump((marshal.version, digest, content), f)
+    except ValueError as e:
+        unlink(tmp_path)
+
+        # Translations contain values which cannot be marshalled, they will be parsed every time
+        logger.warn("Translations cannot be cached to '{}': {}".format(cache_path, e))
+        return
+
+    replace(tmp_path, cache_path)
+
+
+def load_translations(package_name: str, cache_dir: str) -> int:
+    """Load translations of a registered package for all languages, using compiled cache when possible
+
+    Each language file is cached separately and is identified by hash of its content, so only changed files are parsed.
+    Returns number of parsed files.
+    """
+    pkg = lang.get_packages()[package_name]
+    parsed = 0
+
+    for language in lang.langs():
+        if language in pkg:
+            continue
+
+        try:
+            with open(path.join(pkg['__path'], language + '.yml'), 'rb') as f:
+                source = f.read()
+        except OSError:
+            continue
+
+        digest = hashlib.sha1(source).hexdigest()
+        cache_path = path.join(cache_dir, package_name, language + '.marshal')
+
+        content = _read_cache(cache_path, digest)
+        if content is None:
+            import yaml
+            content = yaml.load(source.decode('utf-8'), yaml.FullLoader) or {}
+            _write_cache(cache_path, digest, content)
+            parsed += 1
+
+        # Same storage is used by lang.get_package_translations() to cache parsed files
+        pkg[language] = content
+
+    return parsed
+
+
+def reload_translations(package_name: str, language: str, cache_dir: str = None):
+    """Reload translations of a registered package for a language
+    """
+    lang.get_packages()[package_name].pop(language, None)
+
+    # Without cache directory translations will be parsed on first use
+    if cache_dir:
+        load_translations(package_name, cache_dir)
+
+    # Translated strings are cached by lang itself
+    lang.clear_cache()
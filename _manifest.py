@@ -0,0 +1,177 @@
+"""PytSite Theme Assets Manifest
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import json
+from typing import Dict, Optional, Tuple
+from os import path, walk, unlink, replace, getpid, stat
+from time import monotonic
+from pytsite import reg, logger
+
+_MANIFEST_FILE_NAME = 'theming-manifest.json'
+
+# Extensions of assets which are worth to be compressed
+_TEXT_EXTENSIONS = ('.css', '.js', '.map', '.json', '.svg', '.html', '.txt', '.xml', '.ttf', '.eot', '.otf')
+
+# Loaded manifests: package name -> (manifest, identity of manifest's file, time of next check)
+_manifests = {}  # type: Dict[str, Tuple[Dict[str, str], Optional[tuple], float]]
+
+
+def _manifest_path(package_name: str) -> str:
+    from plugins import assetman
+
+    return path.join(assetman.assets_dst(package_name), _MANIFEST_FILE_NAME)
+
+
+def _hashed_name(f_path: str, digest: str) -> str:
+    root, ext = path.splitext(f_path)
+
+    return '{}.{}{}'.format(root, digest[:12], ext)
+
+
+def _compress(f_path: str, brotli) -> int:
+    """Write compressed variants of a file
+    """
+    import gzip
+
+    with open(f_path, 'rb') as f:
+        data = f.read()
+
+    count = 0
+    variants = [('.gz', lambda d: gzip.compress(d, 9, mtime=0))]
+    if brotli:
+        variants.append(('.br', brotli.compress))
+
+    for ext, compress in variants:
+        compressed = compress(data)
+
+        # Compressed variant is useless if it is not smaller than the original
+        if len(compressed) < len(data):
+            with open(f_path + ext, 'wb') as f:
+                f.write(compressed)
+            count += 1
+
+    return count
+
+
+def build(package_name: str):
+    """Write content hashed copies and compressed variants of built assets and the manifest
+    """
+    import hashlib
+    from shutil import copyfile
+    from plugins import assetman
+
+    assets_dir = assetman.assets_dst(package_name)
+    if not path.isdir(assets_dir):
+        return
+
+    # Remove files generated by previous build
+    for generated in _read(package_name).values():
+        for f_path in (generated, generated + '.gz', generated + '.br'):
+            f_path = path.join(assets_dir, f_path)
+            if path.isfile(f_path):
+                unlink(f_path)
+
+    brotli = None
+    compress = reg.get('theme.assets_compress', True)
+    if compress:
+        try:
+            import brotli
+        except ImportError:
+            logger.debug("Brotli is not installed, only gzip variants of assets will be written")
+
+    manifest = {}
+    compressed = 0
+    for root, dirs, files in walk(assets_dir):
+        for f_name in files:
+            f_path = path.join(root, f_name)
+            if f_name == _MANIFEST_FILE_NAME or f_name.endswith(('.gz', '.br')):
+                continue
+
+            h = hashlib.sha256()
+            with open(f_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    h.update(chunk)
+
+            hashed_path = _hashed_name(f_path, h.hexdigest())
+            copyfile(f_path, hashed_path)
+            manifest[path.relpath(f_path, assets_dir)] = path.relpath(hashed_path, assets_dir)
+
+            if compress and f_name.endswith(_TEXT_EXTENSIONS):
+                compressed += _compress(f_path, brotli)
+                compressed += _compress(hashed_path, brotli)
+
+    m_path = path.join(assets_dir, _MANIFEST_FILE_NAME)
+    tmp_path = '{}.{}'.format(m_path, getpid())
+    with open(tmp_path, 'wt') as f:
+        json.dump(manifest, f, sort_keys=True)
+    replace(tmp_path, m_path)
+
+    _manifests.pop(package_name, None)
+
+    logger.debug("Assets manifest of theme '{}' written: {} assets, {} compressed variants".
+                 format(package_name, len(manifest), compressed))
+
+
+def _read(package_name: str) -> Dict[str, str]:
+    try:
+        with open(_manifest_path(package_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def reset(package_name: str = None):
+    """Forget loaded manifests
+    """
+    if package_name:
+        _manifests.pop(package_name, None)
+    else:
+        _manifests.clear()
+
+
+def _file_id(package_name: str) -> Optional[tuple]:
+    """Get identity of manifest's file, which changes when the file is written or restored from the build cache
+    """
+    try:
+        st = stat(_manifest_path(package_name))
+        return st.st_ino, st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+def _refresh(package_name: str, now: float) -> tuple:
+    """Load a manifest if its file has been changed, possibly by another process
+    """
+    from . import _api
+
+    # Only themes have manifests
+    if package_name not in _api.get_all():
+        entry = _manifests[package_name] = ({}, None, float('inf'))
+        return entry
+
+    prev = _manifests.get(package_name)
+    file_id = _file_id(package_name)
+    manifest = prev[0] if prev and prev[1] == file_id else _read(package_name)
+    entry = _manifests[package_name] = (manifest, file_id, now + reg.get('theme.assets_manifest_check_interval', 1))
+
+    return entry
+
+
+def resolve(location: str) -> str:
+    """Get location of content hashed copy of an asset
+    """
+    package_name, sep, asset_path = location.partition('@')
+    if not sep:
+        return location
+
+    now = monotonic()
+    entry = _manifests.get(package_name)
+    if entry is None or now >= entry[2]:
+        entry = _refresh(package_name, now)
+
+    hashed_path = entry[0].get(asset_path)
+
+    return package_name + '@' + hashed_path if hashed_path else location
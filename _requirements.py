@@ -0,0 +1,245 @@
+"""PytSite Theme Requirements Helpers
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import re
+import sys
+import json
+from typing import Dict, Iterable, Optional, Tuple
+from os import path, makedirs, replace, getpid, listdir
+from time import time
+from semaver import VersionRange, InvalidVersionIdentifier
+from pytsite import package_info, plugman, reg
+
+_DIST_NAME_RE = re.compile('[-_.]+')
+
+# Extensions of distributions metadata entries, which have names like 'name-version[-pyX.Y].ext'
+_DIST_EXTS = ('.dist-info', '.egg-info', '.egg')
+
+# Versions of distributions found on sys.path, filled on first use
+_dist_versions = None  # type: Dict[str, str]
+
+
+def _dist_name(name: str) -> str:
+    return _DIST_NAME_RE.sub('_', name).lower()
+
+
+def _parse_dist_entry(entry: str) -> Optional[Tuple[str, str]]:
+    """Get distribution's name and version from name of its metadata directory, egg or zip archive entry
+    """
+    for ext in _DIST_EXTS:
+        if entry.endswith(ext):
+            name, _, version = entry[:-len(ext)].partition('-')
+            if version:
+                # Eggs have Python version and platform in their names
+                return _dist_name(name), version.split('-')[0]
+
+
+def _sys_path_entries(sys_path: str) -> Iterable[str]:
+    """Get names of top level entries of a sys.path item, which is either a directory or a zip archive
+    """
+    sys_path = sys_path or '.'
+
+    if path.isdir(sys_path):
+        try:
+            return listdir(sys_path)
+        except OSError:
+            return ()
+
+    if path.isfile(sys_path):
+        from zipfile import ZipFile, BadZipFile
+
+        try:
+            with ZipFile(sys_path) as z:
+                return {n.split('/')[0] for n in z.namelist()}
+        except (OSError, BadZipFile):
+            pass
+
+    return ()
+
+
+def _dist_info_version(pkg_name: str) -> Optional[str]:
+    """Get installed pip package's version from names of distributions metadata entries
+
+    sys.path is scanned once per process; use reset_package_versions() after installing packages.
+    """
+    global _dist_versions
+
+    if _dist_versions is None:
+        versions = {}
+        for sys_path in sys.path:
+            # Egg itself may be a sys.path item
+            for entry in [path.basename(sys_path)] + list(_sys_path_entries(sys_path)):
+                parsed = _parse_dist_entry(entry)
+                if parsed:
+                    # First distribution found on sys.path is the one which is imported
+                    versions.setdefault(*parsed)
+        _dist_versions = versions
+
+    return _dist_versions.get(_dist_name(pkg_name))
+
+
+def reset_package_versions():
+    """Forget versions of installed pip packages, so they are looked up again
+    """
+    global _dist_versions
+
+    _dist_versions = None
+
+
+def package_version(pkg_name: str) -> Optional[str]:
+    """Get installed pip package's version without spawning pip
+    """
+    version = _dist_info_version(pkg_name)
+    if version:
+        return version
+
+    # Distributions metadata machinery is slow to import, so it is used only for packages installed in other ways
+    try:
+        from importlib.metadata import version as dist_version, PackageNotFoundError as DistNotFound
+    except ImportError:  # Python < 3.8
+        from pkg_resources import DistributionNotFound as DistNotFound, get_distribution
+
+        def dist_version(name: str) -> str:
+            return get_distribution(name).version
+
+    try:
+        return dist_version(pkg_name)
+    except DistNotFound:
+        return None
+
+
+def plugin_version(plugin_name: str) -> Optional[str]:
+    """Get installed plugin's version
+    """
+    try:
+        return str(plugman.local_plugin_info(plugin_name)['version'])
+    except plugman.error.PluginNotInstalled:
+        return None
+
+
+def installed_versions(requires: dict) -> dict:
+    """Get installed versions of requirements
+    """
+    return {
+        'pytsite': str(package_info.version('pytsite')),
+        'packages': {p_name: package_version(p_name) for p_name in sorted(requires['packages'])},
+        'plugins': {p_name: plugin_version(p_name) for p_name in sorted(requires['plugins'])},
+    }
+
+
+def _cache_path() -> str:
+    from . import _api
+
+    return path.join(_api.storage_path(), 'requirements.json')
+
+
+def _read_cache() -> dict:
+    try:
+        with open(_cache_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _requires_strings(requires: dict) -> dict:
+    return {
+        'packages': {k: str(v) for k, v in sorted(requires['packages'].items())},
+        'plugins': {k: str(v) for k, v in sorted(requires['plugins'].items())},
+    }
+
+
+def _unsatisfied(requires: dict, installed: dict) -> list:
+    r = []
+
+    for kind in ('packages', 'plugins'):
+        for r_name, r_range in requires[kind].items():
+            try:
+                if not installed[kind][r_name] or installed[kind][r_name] not in VersionRange(r_range):
+                    r.append(r_name)
+            except InvalidVersionIdentifier:
+                r.append(r_name)
+
+    return r
+
+
+def resolution_miss(scope: str, requires: dict) -> Optional[str]:
+    """Check if requirements must be resolved, i. e. installed or checked
+
+    Returns None if requirements have been resolved before and nothing has changed since then, otherwise returns the
+    reason of the cache miss.
+    """
+    entry = _read_cache().get(scope)
+    if not entry:
+        return 'requirements have not been resolved before'
+
+    if entry['requires'] != _requires_strings(requires):
+        return 'requirements have been changed'
+
+    if time() - entry['time'] > reg.get('theme.requirements_cache_ttl', 86400):
+        return 'previous resolution has expired'
+
+    installed = installed_versions(requires)
+    changed = ['{} {} -> {}'.format(k, entry['installed'][kind].get(k), v)
+               for kind in ('packages', 'plugins') for k, v in installed[kind].items()
+               if entry['installed'][kind].get(k) != v]
+    if changed:
+        return 'installed versions have been changed: {}'.format(', '.join(changed))
+
+    unsatisfied = _unsatisfied(requires, installed)
+    if unsatisfied:
+        return 'requirements are not satisfied: {}'.format(', '.join(unsatisfied))
+
+
+def store_resolution(scope: str, requires: dict):
+    """Remember that requirements have been resolved
+    """
+    # Requirements have just been installed
+    reset_package_versions()
+
+    cache = _read_cache()
+    cache[scope] = {
+        'requires': _requires_strings(requires),
+        'installed': installed_versions(requires),
+        'time': time(),
+    }
+
+    cache_path = _cache_path()
+    makedirs(path.dirname(cache_path), 0o755, True)
+
+    # Several processes may write the cache simultaneously, so replace it atomically
+    tmp_path = '{}.{}'.format(cache_path, getpid())
+    with open(tmp_path, 'wt') as f:
+        json.dump(cache, f)
+    replace(tmp_path, cache_path)
+
+
+def merge(requirements: Iterable[Dict[str, VersionRange]]) -> Dict[str, VersionRange]:
+    """Merge several requirements sets into one, intersecting version ranges of the same requirement
+
+    Raises ThemeRequirementsConflict if version ranges of a requirement have no common versions.
+    """
+    from . import _error
+
+    bounds = {}  # type: Dict[str, list]
+    ranges = {}  # type: Dict[str, list]
+    conflicts = set()
+    for reqs in requirements:
+        for r_name, r_range in reqs.items():
+            r_range = VersionRange(r_range)
+            ranges.setdefault(r_name, []).append(r_range)
+            if r_name not in bounds:
+                bounds[r_name] = [r_range.minimum, r_range.maximum]
+                continue
+            r_min = max(bounds[r_name][0], r_range.minimum)
+            r_max = min(bounds[r_name][1], r_range.maximum)
+            if r_min > r_max:
+                conflicts.add(r_name)
+            bounds[r_name] = [r_min, r_max]
+
+    if conflicts:
+        raise _error.ThemeRequirementsConflict({r_name: ranges[r_name] for r_name in conflicts})
+
+    return {r_name: VersionRange('>={},<={}'.format(*b)) for r_name, b in sorted(bounds.items())}
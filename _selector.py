@@ -0,0 +1,91 @@
+"""PytSite Theme Per-request Selection
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+from typing import Callable, List, Optional
+from pytsite import reg, logger, http
+from . import _api
+
+_RULE_TYPES = ('host', 'path', 'header', 'cookie')
+
+_selectors = []  # type: List[Callable[[http.Request], Optional[str]]]
+
+# Validated selection rules
+_rules = None  # type: List[dict]
+
+
+def _rule_value(rule: dict, request: http.Request) -> Optional[str]:
+    """Get request's value checked by a rule
+    """
+    r_type = rule.get('type')
+
+    if r_type == 'host':
+        return request.host.split(':')[0]
+    elif r_type == 'path':
+        return request.path
+    elif r_type == 'header':
+        return request.headers.get(rule['name'])
+    elif r_type == 'cookie':
+        return request.cookies.get(rule['name'])
+
+
+def _select_by_rules(request: http.Request) -> Optional[str]:
+    """Select a theme using rules defined in 'theme.selection_rules' registry key
+
+    Each rule is a dict with keys 'type' (one of 'host', 'path', 'header', 'cookie'), 'name' (header or cookie name),
+    'value' and 'theme'. Path rules match by prefix, other rules match by exact value. Header and cookie rules without
+    'value' match any value and, if 'theme' is not specified, the value itself is used as theme's package name. Such
+    a rule picks only among preloaded themes, i. e. ones listed in 'theme.multi_themes' or in other rules, and does
+    not match if the value is not a package name of one of them.
+    """
+    for rule in rules():
+        actual = _rule_value(rule, request)
+        if actual is None:
+            continue
+
+        expected = rule.get('value')
+        if expected is None:
+            if rule['type'] in ('header', 'cookie') and (rule.get('theme') or _api.is_preloaded(actual)):
+                return rule.get('theme', actual)
+        elif actual.startswith(expected) if rule['type'] == 'path' else actual == expected:
+            return rule.get('theme')
+
+
+def rules() -> List[dict]:
+    """Get valid selection rules
+    """
+    global _rules
+
+    if _rules is not None:
+        return _rules
+
+    r = []
+    for rule in reg.get('theme.selection_rules', []):
+        if rule.get('type') not in _RULE_TYPES or (rule['type'] in ('header', 'cookie') and not rule.get('name')):
+            logger.warn('Invalid theme selection rule: {}'.format(rule))
+        else:
+            r.append(rule)
+
+    _rules = r
+
+    return r
+
+
+def register_selector(selector: Callable[[http.Request], Optional[str]]):
+    """Register a theme selector
+
+    Selector gets current request and returns theme's package name or None. Registered selectors are called in order
+    of registration before selection rules.
+    """
+    _selectors.append(selector)
+
+
+def select(request: http.Request) -> Optional[str]:
+    """Get package name of a theme selected for a request
+    """
+    for selector in _selectors + [_select_by_rules]:
+        package_name = selector(request)
+        if package_name:
+            return package_name
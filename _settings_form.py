@@ -6,12 +6,16 @@ __license__ = 'MIT'
 
 import re
 import htmler
-from pytsite import lang
+from typing import List
+from pytsite import lang, reg
 from plugins import widget, settings, http_api, file_ui
-from . import _api
+from . import _api, _cache, _theme, _images
 
 _TRANSLATION_MSG_ID_RE = re.compile('^translation_[a-z0-9._@]+')
 
+# Rendered themes browser tables
+_browsers = _cache.create_pool('themes_browser', 32)
+
 
 class _ThemesBrowser(widget.Abstract):
     def __init__(self, uid: str, **kwargs):
@@ -21,8 +25,25 @@ class _ThemesBrowser(widget.Abstract):
 
         self._data['http-api-ep-switch'] = http_api.endpoint('theming@switch')
         self._data['http-api-ep-uninstall'] = http_api.endpoint('theming@uninstall')
+        self._data['rows-per-page'] = reg.get('theme.browser_rows_per_page', 50)
 
     def _get_element(self, **kwargs) -> htmler.Element:
+        current = _api.get()
+        themes = _api.get_all()
+
+        # Rendered table depends on language, current theme and set of registered themes
+        key = (lang.get_current(), _api.fingerprint())
+
+        try:
+            html = _browsers.get(key)
+        except KeyError:
+            html = _browsers.put(key, self._render(current, list(themes.values())))
+
+        return htmler.TagLessElement(html)
+
+    def _render(self, current: _theme.Theme, themes: List[_theme.Theme]) -> str:
+        """Render themes table
+        """
         cont = htmler.TagLessElement()
 
         cont.append_child(htmler.H2(lang.t('theming@installed_themes')))
@@ -36,26 +57,33 @@ class _ThemesBrowser(widget.Abstract):
         t_head.append_child(htmler.Th(lang.t('theming@url')))
         t_head.append_child(htmler.Th(lang.t('theming@actions')))
 
+        # Buttons titles are same for all rows
+        switch_title = lang.t('theming@switch_to_this_theme')
+        uninstall_title = lang.t('theming@uninstall_theme')
+
+        # Rows beyond first page are shown incrementally on client side
+        rows_per_page = self._data['rows-per-page']
+
         t_body = table.append_child(htmler.Tbody())
-        for theme in _api.get_all().values():
-            tr = t_body.append_child(htmler.Tr())
+        for i, theme in enumerate(themes):
+            tr = t_body.append_child(htmler.Tr(style='display: none') if i >= rows_per_page else htmler.Tr())
             tr.append_child(htmler.Td(theme.name))
-            tr.append_child(htmler.Td(theme.version))
+            tr.append_child(htmler.Td(str(theme.version)))
             tr.append_child(htmler.Td(htmler.A(theme.author['name'], href=theme.author['url'], target='_blank')))
             tr.append_child(htmler.Td(htmler.A(theme.url, href=theme.url, target='_blank')))
 
             actions = htmler.TagLessElement(child_sep='&nbsp;')
 
-            if _api.get().name != theme.name:
+            if current.name != theme.name:
                 # 'Switch' button
-                btn_switch = htmler.A(title=lang.t('theming@switch_to_this_theme'), href='#', role='button',
+                btn_switch = htmler.A(title=switch_title, href='#', role='button',
                                       css='btn btn-default btn-light btn-sm button-switch',
                                       data_package_name=theme.package_name)
                 btn_switch.append_child(htmler.I(css='fa fas fa-power-off'))
                 actions.append_child(btn_switch)
 
                 # 'Uninstall' button
-                btn_delete = htmler.A(title=lang.t('theming@uninstall_theme'), href='#', role='button',
+                btn_delete = htmler.A(title=uninstall_title, href='#', role='button',
                                       css='btn btn-danger btn-sm button-uninstall',
                                       data_package_name=theme.package_name)
                 btn_delete.append_child(htmler.I(css='fa fas fa-trash'))
@@ -63,7 +91,11 @@ class _ThemesBrowser(widget.Abstract):
 
             tr.append_child(htmler.Td(actions))
 
-        return cont
+        if len(themes) > rows_per_page:
+            cont.append_child(htmler.A(lang.t('theming@show_more_themes'), href='#', role='button',
+                                       css='btn btn-default btn-light btn-sm button-show-more'))
+
+        return cont.render()
 
 
 class Form(settings.Form):
@@ -121,3 +153,18 @@ class Form(settings.Form):
         ))
 
         super()._on_setup_widgets()
+
+    def _on_submit(self):
+        super()._on_submit()
+
+        # Images may have been changed
+        _cache.clear('favicons')
+        _cache.clear('logos')
+
+        # Settings of any theme could be changed by the form
+        for theme in _api.get_all().values():
+            theme.settings.invalidate()
+
+        # Resize images in background, so the first viewers do not have to wait for it
+        if any(reg.get(s) for s in _images.sizes()):
+            _images.generate_async()
@@ -4,39 +4,90 @@ __author__ = 'Oleksandr Shepetko'
 __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
+import json
+from typing import List, Optional
+from collections import OrderedDict
+from time import monotonic, time
 from importlib import import_module
-from os import path, makedirs
-from semaver import VersionRange
+from os import path, makedirs, replace, getpid, stat
+from semaver import Version, VersionRange
 from pytsite import logger, package_info, reg, plugman, lang, tpl
-from . import _error
+from . import _error, _requirements, _theme_settings
+
+# Checks made by Theme.load, which are skipped if the load stamp matches
+_STAMPED_CHECKS = ('requirements check', 'resources directories check', 'translation stubs check')
 
 
 class Theme:
     """PytSite Theme
     """
 
-    def __init__(self, package_name: str):
+    def __init__(self, package_name: str, metadata: dict = None):
         """Init
         """
-        # Load package data from 'theme.json'
-        pkg_data = package_info.data(package_name)
-
         self._package_name = package_name
-        self._path = package_info.resolve_package_path(package_name)
-        self._name = pkg_data['name']
-        self._version = pkg_data['version']
-        self._description = pkg_data['description']
-        self._author = pkg_data['author']
-        self._url = pkg_data['url']
-        self._requires = pkg_data['requires']
+        self._metadata = metadata
+        self._is_metadata_loaded = False
+
+        self._path = None  # type: str
+        self._name = None  # type: str
+        self._version = None  # type: Version
+        self._description = None  # type: dict
+        self._author = None  # type: dict
+        self._url = None  # type: str
+        self._requires = None  # type: dict
+        self._settings_defaults = None  # type: dict
+        self._settings = None  # type: _theme_settings.ThemeSettings
 
         self._module = None
         self._is_loaded = False
+        self._registered = set()  # Resources registered by previous, possibly failed, load attempts
+        self._load_duration = None  # type: float
+        self._timings = OrderedDict()  # type: OrderedDict
+        self._skipped = []  # type: List[str]
 
-    def load(self):
-        """Load the theme
+    def load_metadata(self):
+        """Load theme's metadata from previously indexed data or from 'theme.json'
         """
-        from plugins import assetman
+        if self._is_metadata_loaded:
+            return
+
+        try:
+            if self._metadata is None:
+                pkg_data = package_info.data(self._package_name)
+                self._path = package_info.resolve_package_path(self._package_name)
+                self._version = pkg_data['version']
+                self._requires = pkg_data['requires']
+            else:
+                pkg_data = self._metadata
+                self._path = pkg_data['path']
+                self._version = Version(pkg_data['version'])
+                self._requires = {
+                    'pytsite': VersionRange(pkg_data['requires']['pytsite']),
+                    'packages': {k: VersionRange(v) for k, v in pkg_data['requires']['packages'].items()},
+                    'plugins': {k: VersionRange(v) for k, v in pkg_data['requires']['plugins'].items()},
+                }
+
+            self._name = pkg_data['name']
+            self._description = pkg_data['description']
+            self._author = pkg_data['author']
+            self._url = pkg_data['url']
+            self._settings_defaults = dict(pkg_data.get('settings') or {})
+
+            reserved = sorted(_theme_settings.RESERVED_NAMES.intersection(self._settings_defaults))
+            if reserved:
+                raise ValueError('names of settings are reserved: {}'.format(', '.join(reserved)))
+        except (package_info.error.Error, KeyError, ValueError) as e:
+            raise _error.ThemeInitError("Error while loading metadata of theme '{}': {}".format(self._package_name, e))
+
+        self._is_metadata_loaded = True
+
+    def _check_requirements_and_resources(self) -> bool:
+        """Check theme's requirements and create missing resources directories
+
+        Returns True if any directory or file has been created.
+        """
+        created = False
 
         # Check for requirements
         try:
@@ -48,6 +99,7 @@ class Theme:
         lang_dir = path.join(self._path, 'res', 'lang')
         if not path.exists(lang_dir):
             makedirs(lang_dir, 0o755, True)
+            created = True
 
         # Create translation stub files
         for lng in lang.langs():
@@ -55,85 +107,276 @@ class Theme:
             if not path.exists(lng_f_path):
                 with open(lng_f_path, 'wt'):
                     pass
+                created = True
+
+        # Create templates and assets directories
+        for res_dir in ('tpl', 'assets'):
+            res_path = path.join(self._path, 'res', res_dir)
+            if not path.exists(res_path):
+                makedirs(res_path, 0o755, True)
+                created = True
+
+        return created
+
+    @property
+    def _load_stamp_path(self) -> str:
+        from . import _api
+
+        return path.join(_api.storage_path(), 'stamps', self._package_name + '.json')
+
+    def _get_load_stamp(self) -> dict:
+        """Get current load stamp
+
+        Stamp is made of inputs which are cheap to get. Installed versions of requirements are not part of it, because
+        looking them up costs about as much as checking requirements.
+        """
+        # Adding or removing resource directories or translation files changes these mtimes
+        res_mtimes = []
+        for res_path in (path.join(self._path, 'res'), path.join(self._path, 'res', 'lang')):
+            try:
+                res_mtimes.append(stat(res_path).st_mtime_ns)
+            except OSError:
+                res_mtimes.append(None)
+
+        return {
+            'path': self._path,
+            'version': str(self._version),
+            'res_mtimes': res_mtimes,
+            'langs': lang.langs(),
+            'pytsite': str(package_info.version('pytsite')),
+        }
+
+    def _read_load_stamp(self) -> Optional[dict]:
+        """Read load stamp stored by previous load
+        """
+        try:
+            with open(self._load_stamp_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_load_stamp(self, stamp: dict, installed: dict):
+        """Store load stamp along with installed versions of requirements
+        """
+        stamp_path = self._load_stamp_path
+        makedirs(path.dirname(stamp_path), 0o755, True)
+
+        tmp_path = '{}.{}'.format(stamp_path, getpid())
+        with open(tmp_path, 'wt') as f:
+            json.dump({'stamp': stamp, 'requirements': installed, 'checked_at': time()}, f)
+        replace(tmp_path, stamp_path)
+
+    def _load_stamp_matches(self, stamp: dict) -> bool:
+        """Check if requirements and resources checks can be skipped
+        """
+        stored = self._read_load_stamp()
+        if not stored or stored.get('stamp') != stamp:
+            return False
+
+        if time() - stored.get('checked_at', 0) < reg.get('theme.load_stamp_ttl', 3600):
+            return True
+
+        # Requirements may have been installed or removed without changing the stamp, so they are looked up once
+        # in a while
+        installed = _requirements.installed_versions(self._requires)
+        if installed != stored.get('requirements'):
+            return False
+
+        self._write_load_stamp(stamp, installed)
+
+        return True
+
+    def _timed(self, phase: str, item: str = None):
+        """Record duration of a load phase or of an item within it
+        """
+        t_start = monotonic()
+
+        def stop():
+            duration = monotonic() - t_start
+            p = self._timings.setdefault(phase, {'duration': 0.0, 'items': OrderedDict()})
+            if item is None:
+                p['duration'] = duration
+            else:
+                p['items'][item] = duration
+
+        return stop
+
+    def _register(self, resource: str, register):
+        """Register theme's resources once, so a failed load can be retried
+        """
+        if resource not in self._registered:
+            register(self._package_name)
+            self._registered.add(resource)
+
+    def load(self, build_assets: bool = None):
+        """Load the theme
+
+        If build_assets is None, assets are built only if 'theme.compiled' registry flag is not set.
+        """
+        from plugins import assetman
+
+        self._timings.clear()
+        t_start = monotonic()
+
+        self.load_metadata()
+
+        # Filesystem scaffolding and requirements checking can be skipped if nothing has changed since last load
+        stop = self._timed('requirements')
+        stamp = self._get_load_stamp()
+        if self._load_stamp_matches(stamp):
+            self._skipped = list(_STAMPED_CHECKS)
+        else:
+            self._skipped = []
+            # Created directories and files change mtimes the stamp is made of
+            if self._check_requirements_and_resources():
+                stamp = self._get_load_stamp()
+            self._write_load_stamp(stamp, _requirements.installed_versions(self._requires))
+        stop()
 
         # Register translation resources
-        lang.register_package(self._package_name)
+        stop = self._timed('lang')
+        self._register('lang', lang.register_package)
+        if reg.get('theme.lang_cache', True):
+            from . import _api, _lang
+            parsed = _lang.load_translations(self._package_name, path.join(_api.storage_path(), 'lang'))
+            logger.debug("Translations of theme '{}' loaded, {} files parsed".format(self._package_name, parsed))
+        stop()
 
         # Register template resources
-        tpl_path = path.join(self._path, 'res', 'tpl')
-        if not path.exists(tpl_path):
-            makedirs(tpl_path, 0o755, True)
-        tpl.register_package(self._package_name)
+        stop = self._timed('tpl')
+        self._register('tpl', tpl.register_package)
+        stop()
+
+        # Compile templates ahead of requests
+        if reg.get('theme.tpl_precompile', True):
+            from . import _tpl
+            stop = self._timed('tpl_precompile')
+            count = _tpl.precompile(self._package_name, self._path)
+            stop()
+            logger.debug("{} templates of theme '{}' precompiled".format(count, self._package_name))
 
         # Register assetman resources
-        assets_path = path.join(self._path, 'res', 'assets')
-        if not path.exists(assets_path):
-            makedirs(assets_path, 0o755, True)
-        assetman.register_package(self._package_name)
+        stop = self._timed('assetman')
+        self._register('assetman', assetman.register_package)
+        stop()
 
         # Load required plugins
+        stop = self._timed('plugins')
         for pn, pv in self._requires['plugins'].items():
-            plugman.load(pn, VersionRange(pv))
+            stop_item = self._timed('plugins', pn)
+            plugman.load(pn, pv)
+            stop_item()
+        stop()
 
         # Load theme's module
         try:
+            stop = self._timed('import')
             self._module = import_module(self._package_name)
-            if hasattr(self._module, 'theme_load') and callable(self._module.theme_load):
-                self._module.theme_load()
+            stop()
+
+            stop = self._timed('hooks')
+            hook_names = ['theme_load']
 
             # theme_load_{env.type}() hook
             env_type = reg.get('env.type')
-            hook_names = ['theme_load_{}'.format(env_type)]
+            hook_names.append('theme_load_{}'.format(env_type))
             if env_type == 'wsgi':
                 hook_names.append('theme_load_uwsgi')
+
             for hook_name in hook_names:
-                if hasattr(self._module, hook_name):
-                    getattr(self._module, hook_name)()
+                hook = getattr(self._module, hook_name, None)
+                if callable(hook):
+                    stop_item = self._timed('hooks', hook_name)
+                    hook()
+                    stop_item()
+            stop()
 
             logger.debug("Theme '{}' successfully loaded".format(self._package_name))
         except Exception as e:
             raise _error.ThemeLoadError("Error while loading theme package '{}': {}".format(self._package_name, e))
 
-        # Compile assets
-        if not reg.get('theme.compiled'):
-            assetman.setup()
-            assetman.build(self._package_name)
-            reg.put('theme.compiled', True)
+        # Compile assets or restore them from the build cache
+        if build_assets is None:
+            build_assets = not reg.get('theme.compiled')
+            mark_compiled = True
+        else:
+            mark_compiled = False
+
+        if build_assets:
+            from . import _build
+            stop = self._timed('build')
+            _build.build(self._package_name, self._path)
+            stop()
+            if mark_compiled:
+                reg.put('theme.compiled', True)
 
+        self._load_duration = monotonic() - t_start
         self._is_loaded = True
 
+        logger.info("Theme '{}' loaded in {:.3f}s: {}{}".format(self._package_name, self._load_duration, ', '.join(
+            '{} {:.3f}s'.format(k, v['duration']) for k, v in self._timings.items()),
+            '; skipped: ' + ', '.join(self._skipped) if self._skipped else ''))
+
         return self
 
     @property
     def package_name(self) -> str:
         return self._package_name
 
+    @property
+    def metadata(self) -> dict:
+        """Get JSON serializable theme's metadata
+        """
+        self.load_metadata()
+
+        return {
+            'path': self._path,
+            'name': self._name,
+            'version': str(self._version),
+            'description': self._description,
+            'author': self._author,
+            'url': self._url,
+            'requires': {
+                'pytsite': str(self._requires['pytsite']),
+                'packages': {k: str(v) for k, v in self._requires['packages'].items()},
+                'plugins': {k: str(v) for k, v in self._requires['plugins'].items()},
+            },
+            'settings': self._settings_defaults,
+        }
+
     @property
     def path(self) -> str:
+        self.load_metadata()
         return self._path
 
     @property
     def name(self) -> str:
+        self.load_metadata()
         return self._name
 
     @property
-    def version(self) -> str:
+    def version(self) -> Version:
+        self.load_metadata()
         return self._version
 
     @property
     def description(self) -> dict:
+        self.load_metadata()
         return self._description
 
     @property
     def author(self) -> dict:
+        self.load_metadata()
         return self._author
 
     @property
     def url(self) -> str:
+        self.load_metadata()
         return self._url
 
     @property
     def requires(self) -> dict:
+        self.load_metadata()
         return self._requires
 
     @property
@@ -145,5 +388,20 @@ class Theme:
         return self._is_loaded
 
     @property
-    def settings(self) -> dict:
-        return reg.get('theme.theme_' + self._name, {})
+    def timings(self) -> dict:
+        """Get JSON serializable durations of last load's phases
+        """
+        return {
+            'total': self._load_duration,
+            'phases': [{'name': k, 'duration': v['duration'], 'items': dict(v['items'])}
+                       for k, v in self._timings.items()],
+            'skipped': list(self._skipped),
+        }
+
+    @property
+    def settings(self) -> _theme_settings.ThemeSettings:
+        if self._settings is None:
+            self.load_metadata()
+            self._settings = _theme_settings.ThemeSettings(self, self._settings_defaults)
+
+        return self._settings
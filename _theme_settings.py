@@ -0,0 +1,149 @@
+"""PytSite Theme Settings
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+from typing import Any, Callable, Iterator, Mapping, MutableMapping
+from threading import RLock
+from time import monotonic
+from pytsite import reg, events
+
+_TRUE_STRINGS = ('1', 'true', 'yes', 'on')
+
+
+def _coerce(value: Any, default: Any) -> Any:
+    """Convert a value to the type of its default
+    """
+    if default is None or value is None or isinstance(value, type(default)):
+        return value
+
+    try:
+        if isinstance(default, bool):
+            return value.lower() in _TRUE_STRINGS if isinstance(value, str) else bool(value)
+        elif isinstance(default, (int, float, str)):
+            return type(default)(value)
+    except (TypeError, ValueError):
+        return default
+
+    return value
+
+
+def on_change(handler: Callable[..., None], priority: int = 0):
+    """Shortcut
+    """
+    events.listen('theming@settings_change', handler, priority)
+
+
+class ThemeSettings(MutableMapping):
+    """Theme Settings
+
+    Values stored in the registry are loaded once and converted to the types of defaults declared in the 'settings'
+    section of theme's package data. Since settings can be changed by another application process, loaded values are
+    held for limited time only.
+
+    Settings can be changed like dict items, changes are stored to the registry. Settings are also accessible as
+    attributes, so names of public attributes of this class cannot be used as names of declared settings.
+    """
+
+    def __init__(self, theme, defaults: dict):
+        """Init
+        """
+        self._theme = theme
+        self._reg_key = 'theme.theme_' + theme.name
+        self._defaults = defaults
+        self._values = None  # type: dict
+        self._expires_at = 0.0
+        self._lock = RLock()
+
+    def _load(self) -> dict:
+        values = self._values
+        if values is not None and monotonic() < self._expires_at:
+            return values
+
+        with self._lock:
+            values = {k: _coerce(v, self._defaults.get(k)) for k, v in (reg.get(self._reg_key) or {}).items()}
+            for k, v in self._defaults.items():
+                values.setdefault(k, v)
+
+            # TTL is read on refresh only, so item access does not touch the registry
+            self._values = values
+            self._expires_at = monotonic() + reg.get('theme.settings_cache_ttl', 60)
+
+        return values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._load()[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self.update({key: value})
+
+    def __delitem__(self, key: str):
+        with self._lock:
+            stored = dict(reg.get(self._reg_key) or {})
+            del stored[key]
+            reg.put(self._reg_key, stored)
+
+        self.invalidate()
+
+    def __getattr__(self, key: str) -> Any:
+        if key.startswith('_'):
+            raise AttributeError(key)
+
+        try:
+            return self._load()[key]
+        except KeyError:
+            raise AttributeError("Theme '{}' has no setting '{}'".format(self._theme.name, key))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    @property
+    def defaults(self) -> dict:
+        return dict(self._defaults)
+
+    def copy(self) -> dict:
+        return dict(self._load())
+
+    def update(self, values: Mapping = (), **kwargs):
+        """Store values to the registry
+        """
+        values = dict(values, **kwargs)
+
+        with self._lock:
+            stored = dict(reg.get(self._reg_key) or {})
+            stored.update({k: _coerce(v, self._defaults.get(k)) for k, v in values.items()})
+            reg.put(self._reg_key, stored)
+
+        self.invalidate()
+
+    def put(self, key: str, value: Any):
+        """Store a value to the registry
+        """
+        self.update({key: value})
+
+    def invalidate(self, notify: bool = True):
+        """Drop loaded values and notify listeners
+        """
+        with self._lock:
+            self._values = None
+
+        if notify:
+            events.fire('theming@settings_change', theme=self._theme)
+
+    def on_change(self, handler: Callable[[], None], priority: int = 0):
+        """Subscribe to changes of this theme's settings
+        """
+
+        def listener(theme):
+            if theme is self._theme:
+                handler()
+
+        on_change(listener, priority)
+
+
+# Names which cannot be used for settings, because attribute access to them is shadowed
+RESERVED_NAMES = frozenset(n for n in dir(ThemeSettings) if not n.startswith('_'))
@@ -0,0 +1,111 @@
+"""PytSite Theme Templates Precompilation
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+from os import path, walk, makedirs, unlink
+from jinja2 import FileSystemBytecodeCache, TemplateError
+from pytsite import logger, tpl
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    """Bytecode cache shared by all names of a template
+
+    Same template is requested as '$theme@name', 'name' or '<package>@name', so cache entries are identified by
+    template's file instead of its name. Loaded bytecode is also kept in memory, because PytSite's template loader
+    never reports templates as up to date and they are loaded again on every render.
+    """
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self._codes = {}  # type: dict
+        self._files = {}  # type: dict
+
+    def get_cache_key(self, name: str, filename: str = None) -> str:
+        key = super().get_cache_key(filename or name)
+        if filename:
+            self._files[key] = path.realpath(filename)
+
+        return key
+
+    def load_bytecode(self, bucket):
+        checksum, code = self._codes.get(bucket.key, (None, None))
+        if checksum == bucket.checksum:
+            bucket.code = code
+            return
+
+        # Bucket itself drops bytecode compiled from another source
+        super().load_bytecode(bucket)
+        if bucket.code is not None:
+            self._codes[bucket.key] = (bucket.checksum, bucket.code)
+
+    def dump_bytecode(self, bucket):
+        super().dump_bytecode(bucket)
+        self._codes[bucket.key] = (bucket.checksum, bucket.code)
+
+    def forget(self, filename: str):
+        """Remove bytecode of a template file
+        """
+        filename = path.realpath(filename)
+        for key in [k for k, f in self._files.items() if f == filename]:
+            self._codes.pop(key, None)
+            try:
+                unlink(path.join(self.directory, self.pattern % (key,)))
+            except OSError:
+                pass
+
+
+def enable_bytecode_cache(cache_dir: str):
+    """Store compiled templates in the filesystem, so they can be shared by all application processes
+
+    Cached bytecode is invalidated when template's source changes.
+    """
+    if tpl._env.bytecode_cache is not None:
+        return
+
+    makedirs(cache_dir, 0o755, True)
+    tpl._env.bytecode_cache = _BytecodeCache(cache_dir)
+
+
+def precompile(package_name: str, theme_path: str) -> int:
+    """Compile all theme's templates
+    """
+    # Without bytecode cache compiled templates are not kept anywhere
+    if tpl._env.bytecode_cache is None:
+        return 0
+
+    tpl_dir = path.join(theme_path, 'res', 'tpl')
+    count = 0
+
+    for root, dirs, files in walk(tpl_dir):
+        dirs.sort()
+        for f_name in sorted(files):
+            if not f_name.endswith('.jinja2'):
+                continue
+
+            tpl_name = path.relpath(path.join(root, f_name), tpl_dir)[:-7]
+            try:
+                # Compiled template is stored to the bytecode cache, where it is found under any name of the template
+                tpl._env.get_template('{}@{}'.format(package_name, tpl_name))
+                count += 1
+            except TemplateError as e:
+                logger.warn("Template '{}@{}' cannot be precompiled: {}".format(package_name, tpl_name, e))
+
+    return count
+
+
+def invalidate(tpl_path: str):
+    """Forget compiled template file
+    """
+    tpl_path = path.realpath(tpl_path)
+
+    # Same template can be cached by the environment under several names
+    cache = tpl._env.cache
+    if cache is not None:
+        for key, template in list(cache.items()):
+            if template.filename and path.realpath(template.filename) == tpl_path:
+                del cache[key]
+
+    if isinstance(tpl._env.bytecode_cache, _BytecodeCache):
+        tpl._env.bytecode_cache.forget(tpl_path)
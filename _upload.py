@@ -0,0 +1,182 @@
+"""PytSite Theme Chunked Uploads
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import json
+import hashlib
+import fcntl
+from typing import Dict
+from os import path, makedirs, listdir, unlink, stat
+from time import time
+from zipfile import ZipFile, BadZipFile
+from pytsite import reg, util, logger
+from . import _error
+
+_UPLOADS_PATH = path.join(reg.get('paths.tmp'), 'theming', 'uploads')
+_ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# Hashes of uploads which are being received by current process
+_hashes = {}  # type: Dict[str, list]
+
+
+def _data_path(uid: str) -> str:
+    if not uid.isalnum():
+        raise _error.ThemeUploadError('Invalid upload ID')
+
+    return path.join(_UPLOADS_PATH, uid + '.zip')
+
+
+def _info_path(uid: str) -> str:
+    return _data_path(uid)[:-4] + '.json'
+
+
+def _read_info(uid: str) -> dict:
+    try:
+        with open(_info_path(uid)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise _error.ThemeUploadError("Upload '{}' is not found".format(uid))
+
+
+def _get_hash(uid: str, offset: int):
+    """Get hash of already received data
+    """
+    h = _hashes.get(uid)
+
+    # Previous chunks could be received by another process
+    if not h or h[1] != offset:
+        sha = hashlib.sha256()
+        with open(_data_path(uid), 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                sha.update(chunk)
+        h = _hashes[uid] = [sha, offset]
+
+    return h
+
+
+def _cleanup():
+    """Remove abandoned uploads
+    """
+    ttl = reg.get('theme.upload_ttl', 86400)
+    for f_name in listdir(_UPLOADS_PATH):
+        f_path = path.join(_UPLOADS_PATH, f_name)
+        try:
+            if time() - stat(f_path).st_mtime > ttl:
+                unlink(f_path)
+        except OSError:
+            pass
+
+
+def init(size: int, checksum: str = None) -> dict:
+    """Start a new upload
+    """
+    max_size = reg.get('theme.archive_max_size', 536870912)
+    if not 0 < size <= max_size:
+        raise _error.ThemeUploadError('Upload size must be between 1 and {} bytes'.format(max_size))
+
+    makedirs(_UPLOADS_PATH, 0o755, True)
+    _cleanup()
+
+    uid = util.random_str(32)
+    with open(_info_path(uid), 'wt') as f:
+        json.dump({'size': size, 'checksum': checksum.lower() if checksum else None}, f)
+    open(_data_path(uid), 'wb').close()
+
+    logger.debug("Theme upload '{}' of {} bytes started".format(uid, size))
+
+    return status(uid)
+
+
+def status(uid: str) -> dict:
+    """Get upload's status
+    """
+    info = _read_info(uid)
+
+    return {
+        'upload_id': uid,
+        'size': info['size'],
+        'offset': stat(_data_path(uid)).st_size,
+        'chunk_size': reg.get('theme.upload_chunk_size', 4194304),
+    }
+
+
+def append(uid: str, offset: int, data: bytes, checksum: str = None) -> dict:
+    """Append a chunk
+    """
+    info = _read_info(uid)
+
+    if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+        raise _error.ThemeUploadError('Chunk checksum mismatch')
+
+    with open(_data_path(uid), 'ab') as f:
+        # Chunks of the same upload can be received by several processes simultaneously
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            current_offset = f.seek(0, 2)
+            if offset != current_offset:
+                raise _error.ThemeUploadError('Invalid chunk offset {}, expected {}'.format(offset, current_offset))
+
+            if current_offset + len(data) > info['size']:
+                raise _error.ThemeUploadError('Upload exceeds declared size of {} bytes'.format(info['size']))
+
+            # Reject non-ZIP files as early as possible
+            if offset == 0 and not data.startswith(_ZIP_LOCAL_HEADER_SIGNATURE):
+                raise _error.ThemeUploadError('Uploaded data is not a ZIP file')
+
+            h = _get_hash(uid, offset)
+            f.write(data)
+            f.flush()
+            h[0].update(data)
+            h[1] += len(data)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+    return status(uid)
+
+
+def finalize(uid: str) -> str:
+    """Finish an upload and get path to the received file
+    """
+    info = _read_info(uid)
+    r = status(uid)
+
+    try:
+        if r['offset'] != info['size']:
+            raise _error.ThemeUploadError('Upload is incomplete: {} of {} bytes received'.
+                                          format(r['offset'], r['size']))
+
+        checksum = _get_hash(uid, r['offset'])[0].hexdigest()
+        if info['checksum'] and checksum != info['checksum']:
+            raise _error.ThemeUploadError('Upload checksum mismatch')
+
+        # Check that central directory is readable
+        try:
+            with ZipFile(_data_path(uid)):
+                pass
+        except BadZipFile as e:
+            raise _error.ThemeUploadError('Uploaded file is not a valid ZIP file: {}'.format(e))
+
+    except _error.ThemeUploadError:
+        # Only incomplete uploads can be resumed
+        if r['offset'] == info['size']:
+            abort(uid)
+        raise
+
+    _hashes.pop(uid, None)
+    unlink(_info_path(uid))
+
+    logger.debug("Theme upload '{}' finished, SHA-256: {}".format(uid, checksum))
+
+    return _data_path(uid)
+
+
+def abort(uid: str):
+    """Abort an upload
+    """
+    _hashes.pop(uid, None)
+
+    for f_path in (_data_path(uid), _info_path(uid)):
+        if path.exists(f_path):
+            unlink(f_path)
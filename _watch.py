@@ -0,0 +1,191 @@
+"""PytSite Theme Development Watch Mode
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from os import path, walk, stat
+from time import sleep, monotonic
+from pytsite import reg, logger, threading
+from . import _theme, _cache
+
+# Watched resources directories of a theme
+_RESOURCES = ('tpl', 'lang', 'assets')
+
+_watcher = None
+
+
+class _PollingBackend:
+    """Detects changes by comparing modification times of files
+    """
+
+    def __init__(self, dirs: Iterable[str]):
+        self._dirs = list(dirs)
+        self._mtimes = self._scan()
+
+    def _scan(self) -> Dict[str, float]:
+        r = {}
+        for d in self._dirs:
+            for root, dirs, files in walk(d):
+                dirs[:] = [x for x in dirs if x != 'node_modules']
+                for f_name in files:
+                    f_path = path.join(root, f_name)
+                    try:
+                        r[f_path] = stat(f_path).st_mtime
+                    except OSError:
+                        pass
+
+        return r
+
+    def read(self, timeout: float) -> Set[str]:
+        sleep(timeout)
+
+        mtimes = self._scan()
+        changed = {p for p in set(mtimes) | set(self._mtimes) if mtimes.get(p) != self._mtimes.get(p)}
+        self._mtimes = mtimes
+
+        return changed
+
+
+class _InotifyBackend:
+    """Detects changes using inotify
+    """
+
+    def __init__(self, dirs: Iterable[str]):
+        import inotify_simple
+
+        self._flags = inotify_simple.flags.CLOSE_WRITE | inotify_simple.flags.CREATE | \
+            inotify_simple.flags.DELETE | inotify_simple.flags.MOVED_FROM | inotify_simple.flags.MOVED_TO
+        self._is_dir = inotify_simple.flags.ISDIR
+        self._inotify = inotify_simple.INotify()
+        self._wds = {}  # type: Dict[int, str]
+
+        for d in dirs:
+            self._add(d)
+
+    def _add(self, dir_path: str):
+        for root, dirs, files in walk(dir_path):
+            dirs[:] = [x for x in dirs if x != 'node_modules']
+            self._wds[self._inotify.add_watch(root, self._flags)] = root
+
+    def read(self, timeout: float) -> Set[str]:
+        changed = set()
+        for event in self._inotify.read(int(timeout * 1000)):
+            if event.wd not in self._wds or not event.name:
+                continue
+
+            e_path = path.join(self._wds[event.wd], event.name)
+            if event.mask & self._is_dir:
+                if path.isdir(e_path):
+                    self._add(e_path)
+            else:
+                changed.add(e_path)
+
+        return changed
+
+
+class _Watcher:
+    """Applies changes of themes' resources
+    """
+
+    def __init__(self, themes: Iterable[_theme.Theme]):
+        self._dirs = {}  # type: Dict[str, Tuple[_theme.Theme, str]]
+        for theme in themes:
+            for res in _RESOURCES:
+                res_path = path.join(theme.path, 'res', res)
+                if path.isdir(res_path):
+                    self._dirs[res_path] = (theme, res)
+
+        self._backend = self._create_backend()
+
+    def _create_backend(self):
+        if reg.get('theme.watch_inotify', True):
+            try:
+                return _InotifyBackend(self._dirs)
+            except ImportError:
+                logger.debug('inotify_simple is not installed, changes of themes will be polled')
+            except OSError as e:
+                logger.warn('Changes of themes will be polled, because inotify cannot be used: {}'.format(e))
+
+        return _PollingBackend(self._dirs)
+
+    def _resolve(self, f_path: str) -> Optional[Tuple[_theme.Theme, str, str]]:
+        """Get theme, resource type and path relative to the resource directory of a changed file
+        """
+        for res_path, (theme, res) in self._dirs.items():
+            if f_path.startswith(res_path + path.sep):
+                return theme, res, path.relpath(f_path, res_path)
+
+    def apply(self, changed: Iterable[str]):
+        """Apply changes
+        """
+        from . import _api, _build, _lang, _tpl
+
+        t_start = monotonic()
+        applied = []  # type: List[str]
+        assets = {}  # type: Dict[str, _theme.Theme]
+
+        for f_path in sorted(changed):
+            resolved = self._resolve(f_path)
+            if not resolved:
+                continue
+
+            theme, res, rel_path = resolved
+            if res == 'tpl' and rel_path.endswith('.jinja2'):
+                _tpl.invalidate(f_path)
+                applied.append(f_path)
+            elif res == 'lang' and rel_path.endswith('.yml') and path.sep not in rel_path:
+                cache_dir = path.join(_api.storage_path(), 'lang') if reg.get('theme.lang_cache', True) else None
+                _lang.reload_translations(theme.package_name, rel_path[:-4], cache_dir)
+                applied.append(f_path)
+            elif res == 'assets':
+                assets[theme.package_name] = theme
+
+        # Assets of a theme are built once regardless of number of changed files
+        for theme in assets.values():
+            _build.build(theme.package_name, theme.path, False)
+            applied.append(path.join(theme.path, 'res', 'assets'))
+
+        if applied:
+            _cache.clear()
+            logger.info('Theme changes applied in {:.3f}s: {}'.format(monotonic() - t_start, ', '.join(applied)))
+
+    def run(self):
+        """Watch for changes
+
+        Changes are collected until no new ones appear during the debounce interval, so a burst of writes made by
+        an editor or a VCS checkout is applied at once.
+        """
+        debounce = reg.get('theme.watch_debounce', 0.3)
+        interval = reg.get('theme.watch_interval', 1.0)
+        pending = set()  # type: Set[str]
+
+        while True:
+            try:
+                changed = self._backend.read(debounce if pending else interval)
+                if changed:
+                    pending |= changed
+                elif pending:
+                    self.apply(pending)
+                    pending = set()
+            except Exception as e:
+                pending = set()
+                logger.error(e, exc_info=e)
+
+
+def start(themes: Iterable[_theme.Theme]):
+    """Start watching for changes of themes' resources in background
+    """
+    global _watcher
+
+    if _watcher:
+        return
+
+    themes = list(themes)
+    _watcher = _Watcher(themes)
+    thread = threading.create_thread(_watcher.run)
+    thread.daemon = True
+    thread.start()
+
+    logger.info('Watching for changes of themes: {}'.format(', '.join(t.package_name for t in themes)))
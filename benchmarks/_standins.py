@@ -0,0 +1,199 @@
+"""PytSite Theming Benchmarks Stand-ins
+
+Minimal in-process replacements of `pytsite` and `plugins.*` modules used by the theming plugin, so its code can be
+benchmarked without a PytSite application. Real `semaver` and `htmler` packages are required; stand-ins have been
+validated against semaver 0.2.1 and htmler 0.1.3, the releases which satisfy requirements of `plugin.json`.
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import sys
+import json
+import atexit
+import tempfile
+import threading as _threading
+from uuid import uuid4
+from types import ModuleType, SimpleNamespace
+from os import path, makedirs, symlink
+from shutil import rmtree
+from importlib.util import find_spec
+from semaver import Version, VersionRange
+
+PLUGIN_PATH = path.dirname(path.dirname(path.abspath(__file__)))
+
+root_path = tempfile.mkdtemp(prefix='theming-bench-')
+themes_path = path.join(root_path, 'themes')
+
+registry = {
+    'debug': False,
+    'env.type': 'wsgi',
+    'paths.root': root_path,
+    'paths.storage': path.join(root_path, 'storage'),
+    'paths.tmp': path.join(root_path, 'tmp'),
+    'theme.tpl_bytecode_cache': False,
+    'theme.tpl_precompile': False,
+    'theme.lang_cache': False,
+}
+
+events = {}
+
+
+class _Error(Exception):
+    pass
+
+
+class _FileNotFound(Exception):
+    pass
+
+
+class _File:
+    mime = 'image/png'
+
+    def __init__(self, fid: str):
+        self._fid = fid
+
+    def get_url(self, width: int = 0, height: int = 0, enlarge: bool = False) -> str:
+        return '/image/{}/{}x{}'.format(self._fid, width, height)
+
+
+class _Command:
+    def __init__(self):
+        self._args = []
+
+    def arg(self, index: int, default=None):
+        return self._args[index] if index < len(self._args) else default
+
+
+class _Widget:
+    def __init__(self, uid: str, **kwargs):
+        self._uid = uid
+        self._data = {}
+
+
+def _listen(event: str, handler, priority: int = 0):
+    events.setdefault(event, []).append(handler)
+
+
+def _fire(event: str, **kwargs) -> list:
+    return [h(**kwargs) for h in events.get(event, [])]
+
+
+def _resolve_package_path(package_name: str) -> str:
+    spec = find_spec(package_name)
+    if not spec:
+        raise _Error("Package '{}' is not found".format(package_name))
+
+    return path.dirname(spec.origin)
+
+
+def _package_data(package_name: str) -> dict:
+    with open(path.join(_resolve_package_path(package_name), 'theme.json')) as f:
+        data = json.load(f)
+
+    requires = data.get('requires', {})
+    data.update({
+        'version': Version(data['version']),
+        'requires': {
+            'pytsite': VersionRange(requires.get('pytsite', '>=9.0')),
+            'packages': {k: VersionRange(v) for k, v in requires.get('packages', {}).items()},
+            'plugins': {k: VersionRange(v) for k, v in requires.get('plugins', {}).items()},
+        },
+    })
+
+    return data
+
+
+def _assets_url(location: str) -> str:
+    for handler in events.get('assetman@split_location', []):
+        location = handler(location)
+
+    return '/assets/' + location
+
+
+def _module(name: str, **attrs) -> ModuleType:
+    m = ModuleType(name)
+    m.__dict__.update(attrs)
+    sys.modules[name] = m
+
+    if '.' in name:
+        parent, child = name.rsplit('.', 1)
+        setattr(sys.modules[parent], child, m)
+
+    return m
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+def install():
+    """Install stand-ins and make the plugin importable as `plugins.theming`
+    """
+    for p in (themes_path, registry['paths.storage'], registry['paths.tmp']):
+        makedirs(p, 0o755, True)
+    open(path.join(themes_path, '__init__.py'), 'w').close()
+    atexit.register(rmtree, root_path, True)
+    symlink(PLUGIN_PATH, path.join(root_path, 'theming'))
+    sys.path.insert(0, root_path)
+
+    _module('pytsite', on_app_load=lambda h: _listen('pytsite.on_app_load', h))
+    _module('pytsite.reg', get=lambda k, d=None: registry.get(k, d), put=registry.__setitem__)
+    _module('pytsite.logger', debug=_noop, info=_noop, warn=_noop, error=_noop)
+    _module('pytsite.events', listen=_listen, fire=_fire)
+    _module('pytsite.util', random_str=lambda size=16: uuid4().hex[:size])
+    _module('pytsite.reload', reload=_noop)
+    _module('pytsite.threading', create_thread=_threading.Thread, get_id=_threading.get_ident)
+    _module('pytsite.pip', install=_noop, get_installed_version=lambda n: '1.0')
+    _module('pytsite.plugman', load=_noop, install=_noop, is_installed=lambda n: True,
+            is_management_mode=lambda: False, local_plugin_info=lambda n: {'version': '1.0'},
+            error=SimpleNamespace(PluginNotInstalled=_Error))
+    _module('pytsite.package_info', data=_package_data, resolve_package_path=_resolve_package_path,
+            check_requirements=_noop, version=lambda n: Version('9.0'), error=SimpleNamespace(Error=_Error))
+    _module('pytsite.lang', langs=lambda: ['en', 'uk'], get_current=lambda: 'en', t=lambda msg_id, args=None: msg_id,
+            register_package=_noop, on_split_msg_id=lambda h: _listen('lang@split_msg_id', h))
+    _module('pytsite.tpl', register_package=_noop, register_global=_noop,
+            on_resolve_location=lambda h: _listen('tpl@resolve_location', h))
+    _module('pytsite.metatag', t_set=_noop)
+    _module('pytsite.console', Command=_Command, register_command=_noop, print_normal=_noop, print_info=_noop,
+            print_success=_noop, print_warning=_noop, print_error=_noop)
+    _module('pytsite.update', on_update_stage_2=_noop)
+    _module('pytsite.http', Request=object)
+    _module('pytsite.router', request=lambda: None, on_dispatch=_noop, on_pre_dispatch=_noop,
+            on_xhr_pre_dispatch=_noop)
+
+    plugins = _module('plugins')
+    plugins.__path__ = [root_path]
+
+    registered_assets = set()
+    _module('plugins.assetman', register_package=registered_assets.add,
+            is_package_registered=registered_assets.__contains__,
+            on_split_location=lambda h: _listen('assetman@split_location', h), url=_assets_url, setup=_noop,
+            build=_noop, assets_dst=lambda package_name: path.join(root_path, 'static', package_name))
+    _module('plugins.file', get=_File, error=SimpleNamespace(FileNotFound=_FileNotFound))
+    _module('plugins.http_api', endpoint=lambda name, args=None: '/api/' + name)
+    _module('plugins.settings', Form=object)
+    _module('plugins.widget', Abstract=_Widget, static=SimpleNamespace(HTML=_Widget),
+            input=SimpleNamespace(File=_Widget))
+    _module('plugins.file_ui', widget=SimpleNamespace(ImagesUpload=_Widget))
+
+
+def make_theme(name: str, version: str = '1.0', author: str = 'Author', requires: dict = None) -> str:
+    """Create a synthetic theme
+    """
+    theme_path = path.join(themes_path, name)
+    for d in ('tpl', 'assets', 'lang'):
+        makedirs(path.join(theme_path, 'res', d), 0o755, True)
+    open(path.join(theme_path, '__init__.py'), 'w').close()
+
+    with open(path.join(theme_path, 'theme.json'), 'wt') as f:
+        json.dump({
+            'name': name,
+            'version': version,
+            'description': {'en': 'Theme {}'.format(name)},
+            'author': {'name': author, 'url': 'https://example.com'},
+            'url': 'https://example.com/{}'.format(name),
+            'requires': requires or {},
+        }, f)
+
+    return theme_path
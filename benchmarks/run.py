@@ -0,0 +1,417 @@
+"""PytSite Theming Benchmarks
+
+Runs theming plugin's hot paths against in-process stand-ins of PytSite and prints time per call of each benchmark.
+
+Usage:
+    python benchmarks/run.py [--themes N] [--repeat N] [--filter TEXT] [--save | --compare [--threshold RATIO]]
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import sys
+import gc
+import json
+import platform
+import argparse
+import subprocess
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from time import perf_counter
+from os import path, unlink, makedirs
+from shutil import rmtree
+from zipfile import ZipFile, ZIP_DEFLATED
+import _standins
+
+BASELINE_PATH = path.join(path.dirname(path.abspath(__file__)), 'baseline.json')
+
+# Archives used by extraction benchmarks: label, number of files, size of each file
+ARCHIVES = (
+    ('10x1k', 10, 1024),
+    ('500x4k', 500, 4096),
+    ('2000x512', 2000, 512),
+    ('1x16m', 1, 16777216),
+)
+
+# Modules which must be loaded on first use only, not while the plugin is being loaded
+LAZY_MODULES = (
+    'plugins.theming._install',
+    'plugins.theming._jobs',
+    'plugins.theming._upload',
+    'plugins.theming._build',
+    'plugins.theming._watch',
+    'importlib.metadata',
+    'pkg_resources',
+)
+
+# Benchmarks of cached location resolution and of resolution without cache
+RESOLVE_HIT = 'api.resolve_location.hit.x100'
+RESOLVE_REFERENCE = 'api.resolve_location.reference.x100'
+
+# Imports made by this script are measured by the import time benchmark
+_IMPORT_SCRIPT = '''
+import sys
+import _standins
+_standins.install()
+# Installed versions of theme's requirements are checked on every load
+_standins.make_theme('theme_0', requires={'packages': {'semaver': '>=0.1'}})
+_standins.registry['theme.compiled'] = True
+sys.stderr.write('theming-bench: start\\n')
+import plugins.theming
+plugins.theming.plugin_load()
+for handler in _standins.events['pytsite.on_app_load']:
+    handler()
+sys.stderr.write('theming-bench: end\\n')
+print(' '.join(sys.modules))
+'''
+
+Benchmark = NamedTuple('Benchmark', [
+    ('name', str),
+    ('func', Callable[..., None]),
+    ('number', int),
+    ('setup', Optional[Callable[[], None]]),
+    ('call_setup', Optional[Callable[[], object]]),
+])
+
+_benchmarks = []  # type: List[Benchmark]
+
+# Plugin's modules, imported after stand-ins are installed
+theming = _api = _cache = _eh = _install = _settings_form = None
+
+
+def benchmark(name: str, number: int, setup: Callable[[], None] = None, call_setup: Callable[[], object] = None):
+    """Define a benchmark
+
+    `setup` is called once before timing, `call_setup` is called before each call and its result is passed to the
+    benchmarked function.
+    """
+
+    def decorator(func):
+        _benchmarks.append(Benchmark(name, func, number, setup, call_setup))
+        return func
+
+    return decorator
+
+
+def _reset():
+    """Bring the plugin to the state it has before `plugin_load()`
+    """
+    _standins.events.clear()
+    _api._fallback_theme_name.clear()
+    _api._default = None
+    _api._loaded = None
+    _api._clear_caches()
+
+
+def _remove_index():
+    index_path = path.join(_api.storage_path(), 'index.json')
+    if path.exists(index_path):
+        unlink(index_path)
+
+
+def _start_app():
+    """Load the plugin and the default theme
+    """
+    _reset()
+    theming.plugin_load()
+    for handler in _standins.events['pytsite.on_app_load']:
+        handler()
+
+
+def _make_archive(n_files: int, file_size: int) -> str:
+    archive_path = path.join(_standins.root_path, 'archive-{}x{}.zip'.format(n_files, file_size))
+    if path.exists(archive_path):
+        return archive_path
+
+    with ZipFile(archive_path, 'w', ZIP_DEFLATED) as z:
+        z.writestr('theme/theme.json', '{}')
+        for i in range(n_files):
+            # Half-compressible content
+            data = (bytes(range(256)) * (file_size // 512 + 1))[:file_size // 2]
+            z.writestr('theme/res/assets/{}/{}.bin'.format(i % 20, i), data + bytes(file_size - len(data)))
+
+    return archive_path
+
+
+def _resolve_location_reference(location: str) -> str:
+    """Resolve a location the way event handlers did before resolved locations were cached
+    """
+    if '@' not in location:
+        location = '$theme@' + location
+
+    if '$theme' in location:
+        location = location.replace('$theme', _api.get().package_name)
+
+    return location
+
+
+def _define(n_themes: int):
+    """Define all benchmarks
+    """
+    n_locations = 100
+
+    def resolver(name: str, handler: Callable[[str], str], prefix: str):
+        locations = ['$theme@{}/item-{}'.format(prefix, i) for i in range(n_locations)]
+
+        @benchmark('eh.{}.x{}'.format(name, n_locations), 1000, _start_app)
+        def f():
+            for location in locations:
+                handler(location)
+
+    resolver('on_lang_split_msg_id', _eh.on_lang_split_msg_id, 'msg')
+    resolver('on_tpl_resolve_location', _eh.on_tpl_resolve_location, 'tpl')
+    resolver('on_assetman_split_location', _eh.on_assetman_split_location, 'img')
+
+    # Cached resolution must be cheaper than resolution itself
+    locations = ['$theme@tpl/item-{}'.format(i) for i in range(n_locations)]
+
+    @benchmark(RESOLVE_HIT, 1000, _start_app)
+    def f():
+        for location in locations:
+            _api.resolve_location(location)
+
+    @benchmark(RESOLVE_REFERENCE, 1000, _start_app)
+    def f():
+        for location in locations:
+            _resolve_location_reference(location)
+
+    counter = [0]
+
+    @benchmark('eh.on_tpl_resolve_location.miss.x{}'.format(n_locations), 100, _start_app)
+    def f():
+        for _ in range(n_locations):
+            counter[0] += 1
+            _eh.on_tpl_resolve_location('$theme@tpl/miss-{}'.format(counter[0]))
+
+    @benchmark('eh.on_router_dispatch', 20000, _start_app)
+    def f():
+        _eh.on_router_dispatch()
+
+    def start_app_with_logos():
+        _start_app()
+        _standins.registry['theme.logo'] = 'logo-fid'
+        _standins.registry.pop('theme.logo_footer', None)
+
+    @benchmark('api.logo_url', 20000, start_app_with_logos)
+    def f():
+        _api.logo_url(100, 100)
+
+    @benchmark('api.footer_logo_url', 20000, start_app_with_logos)
+    def f():
+        _api.footer_logo_url()
+
+    @benchmark('api.register.{}'.format(n_themes), 20, call_setup=_reset)
+    def f(_):
+        for i in range(n_themes):
+            _api.register('themes.theme_{}'.format(i))
+
+    def reset_cold():
+        _reset()
+        _remove_index()
+
+    @benchmark('plugin_load.{}.cold'.format(n_themes), 20, call_setup=reset_cold)
+    def f(_):
+        theming.plugin_load()
+
+    @benchmark('plugin_load.{}.warm'.format(n_themes), 20, _start_app, _reset)
+    def f(_):
+        theming.plugin_load()
+
+    def extraction(label: str, n_files: int, file_size: int):
+        archive_path = _make_archive(n_files, file_size)
+        extract_dir = path.join(_standins.root_path, 'extracted')
+
+        def call_setup():
+            rmtree(extract_dir, True)
+            makedirs(extract_dir)
+            return extract_dir
+
+        @benchmark('api.extract_archive.{}'.format(label), 3 if n_files * file_size > 1048576 else 10,
+                   call_setup=call_setup)
+        def f(dst: str):
+            _install._extract_archive(archive_path, dst)
+
+    for a in ARCHIVES:
+        extraction(*a)
+
+    def browser(**kwargs):
+        return _settings_form._ThemesBrowser('themes', **kwargs)
+
+    @benchmark('settings_form.themes_browser.{}.render'.format(n_themes), 20, _start_app,
+               _settings_form._browsers.clear)
+    def f(_):
+        browser()._get_element()
+
+    @benchmark('settings_form.themes_browser.{}.cached'.format(n_themes), 2000, _start_app)
+    def f():
+        browser()._get_element()
+
+
+def _run(b: Benchmark, repeat: int) -> float:
+    """Get best time per call
+    """
+    if b.setup:
+        b.setup()
+
+    best = None
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            total = 0.0
+            if b.call_setup:
+                for _ in range(b.number):
+                    arg = b.call_setup()
+                    t_start = perf_counter()
+                    b.func(arg)
+                    total += perf_counter() - t_start
+            else:
+                t_start = perf_counter()
+                for _ in range(b.number):
+                    b.func()
+                total = perf_counter() - t_start
+
+            best = total if best is None else min(best, total)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return best / b.number
+
+
+def _import_time() -> Tuple[float, Dict[str, float], List[str]]:
+    """Get total time of imports made while the plugin is imported and loaded, time of each import and names of all
+    imported modules
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _IMPORT_SCRIPT],
+                          cwd=path.dirname(path.abspath(__file__)), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+
+    modules = {}
+    started = False
+    for line in proc.stderr.splitlines():
+        if line == 'theming-bench: start':
+            started = True
+        elif line == 'theming-bench: end':
+            break
+        elif started and line.startswith('import time:'):
+            self_us, cumulative_us, name = line[12:].split('|')
+            if self_us.strip().isdigit():
+                modules[name.strip()] = int(self_us) / 1e6
+
+    return sum(modules.values()), modules, proc.stdout.split()
+
+
+def _format_time(seconds: float) -> str:
+    for unit, factor in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * factor >= 1:
+            return '{:.3f} {}'.format(seconds * factor, unit)
+
+    return '{:.1f} ns'.format(seconds * 1e9)
+
+
+def main() -> int:
+    global theming, _api, _cache, _eh, _install, _settings_form
+
+    parser = argparse.ArgumentParser(description='Theming plugin benchmarks')
+    parser.add_argument('--themes', type=int, default=50, help='number of synthetic themes')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timing rounds, the best one is taken')
+    parser.add_argument('--filter', default='', help='run only benchmarks which names contain given text')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='path to the baseline file')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--save', action='store_true', help='store results as the baseline')
+    mode.add_argument('--compare', action='store_true', help='compare results with the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slowdown which is reported as a regression in compare mode')
+    parser.add_argument('--import-budget', type=float, default=20,
+                        help='maximum time of imports made while the plugin is being loaded, ms')
+    args = parser.parse_args()
+
+    _standins.install()
+    for i in range(args.themes):
+        _standins.make_theme('theme_{}'.format(i), '1.{}'.format(i))
+
+    _standins.registry['theme.compiled'] = True
+    _standins.registry['theme.current'] = 'themes.theme_0'
+
+    import plugins.theming as theming
+    from plugins.theming import _api, _cache, _eh, _install, _settings_form
+
+    _define(args.themes)
+
+    baseline = {}
+    if args.compare:
+        try:
+            with open(args.baseline) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print('Cannot read baseline: {}'.format(e), file=sys.stderr)
+            return 2
+
+        baseline = data['results']
+        if data['meta']['themes'] != args.themes:
+            print('Warning: baseline was made with {} themes'.format(data['meta']['themes']), file=sys.stderr)
+
+    results = {}
+    regressions = []
+
+    def report(name: str, r: float):
+        results[name] = r
+        line = '{:<52}{:>14}'.format(name, _format_time(r))
+
+        if name in baseline:
+            ratio = r / baseline[name]
+            line += '{:>14}{:>9.2f}x'.format(_format_time(baseline[name]), ratio)
+            if ratio > 1 + args.threshold:
+                regressions.append(name)
+                line += '  REGRESSION'
+
+        print(line)
+
+    for b in _benchmarks:
+        if args.filter in b.name:
+            report(b.name, _run(b, args.repeat))
+
+    if RESOLVE_HIT in results and RESOLVE_REFERENCE in results and results[RESOLVE_HIT] >= results[RESOLVE_REFERENCE]:
+        regressions.append(RESOLVE_HIT)
+        print('Cached location resolution is not faster than resolution without cache', file=sys.stderr)
+
+    # Import time is measured in separate interpreters
+    if args.filter in 'import.plugin_load':
+        measures = [_import_time() for _ in range(args.repeat)]
+        total, modules, imported = min(measures, key=lambda m: m[0])
+        report('import.plugin_load', total)
+
+        for name, t in sorted(modules.items(), key=lambda m: m[1], reverse=True)[:5]:
+            print('    {:<48}{:>14}'.format(name, _format_time(t)))
+
+        if total > args.import_budget / 1000:
+            regressions.append('import.plugin_load')
+            print('Import time exceeds budget of {} ms'.format(args.import_budget), file=sys.stderr)
+
+        for name in LAZY_MODULES:
+            if name in imported:
+                regressions.append(name)
+                print("Module '{}' must not be imported while the plugin is being loaded".format(name), file=sys.stderr)
+
+    if args.save:
+        # Imported only now, so it does not affect the import time benchmark
+        from importlib.metadata import version
+
+        with open(args.baseline, 'wt') as f:
+            json.dump({
+                'meta': {'python': platform.python_version(), 'platform': platform.platform(), 'themes': args.themes,
+                         'packages': {p: version(p) for p in ('htmler', 'semaver')}},
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Baseline stored to {}'.format(args.baseline))
+
+    if regressions:
+        print('{} regression(s): {}'.format(len(regressions), ', '.join(regressions)), file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,38 @@ import {lang} from '@pytsite/assetman';
 import httpApi from '@pytsite/http-api';
 import setupWidget from '@pytsite/widget';
 
+/**
+ * Wait for a background theme job and reload the page after its completion
+ *
+ * @param {string} endpoint
+ */
+window.pytsiteThemingWaitJob = function (endpoint) {
+    httpApi.get(endpoint).done(job => {
+        if (job.status === 'done') {
+            location.reload();
+        }
+        else if (job.status === 'failed') {
+            alert(lang.t('theming@theme_installation_failed', {msg: job.error}));
+        }
+        else {
+            setTimeout(() => window.pytsiteThemingWaitJob(endpoint), 2000);
+        }
+    }).fail(() => {
+        // Application can be reloading right now
+        setTimeout(() => window.pytsiteThemingWaitJob(endpoint), 2000);
+    });
+};
+
 setupWidget('plugins.theming._settings_form._ThemesBrowser', widget => {
+    widget.em.find('.button-show-more').click(function (e) {
+        e.preventDefault();
+
+        const hiddenRows = widget.em.find('tbody tr:hidden');
+        hiddenRows.slice(0, parseInt(widget.data('rowsPerPage'))).show();
+        if (hiddenRows.length <= parseInt(widget.data('rowsPerPage')))
+            $(this).remove();
+    });
+
     widget.em.find('.button-switch').click(function () {
         if (confirm(lang.t('theming@theme_switch_confirmation'))) {
             $(this).closest('table').find('.btn').addClass('disabled');
@@ -0,0 +1,17 @@
+"""PytSite Theming Tests Configuration
+
+Tests run against stand-ins of PytSite from the benchmarks directory. They are installed before tests collection,
+because plugin's root directory is a package, which is imported by pytest.
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import sys
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), 'benchmarks'))
+
+import _standins  # noqa: E402
+
+_standins.install()
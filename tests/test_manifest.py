@@ -0,0 +1,63 @@
+"""PytSite Theming Assets Manifest Tests
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import json
+import pytest
+import _standins
+from os import path, makedirs, replace
+
+THEME_NAME = 'manifest_theme'
+PACKAGE_NAME = 'themes.' + THEME_NAME
+
+
+@pytest.fixture(scope='module')
+def assets_dir():
+    from plugins.theming import _api
+
+    _standins.make_theme(THEME_NAME)
+    _api.register(PACKAGE_NAME)
+
+    dst = path.join(_standins.root_path, 'static', PACKAGE_NAME)
+    makedirs(path.join(dst, 'css'), 0o755, True)
+    with open(path.join(dst, 'css', 'main.css'), 'wt') as f:
+        f.write('body { color: red; }\n' * 100)
+
+    return dst
+
+
+def _write_manifest(assets_dir: str, manifest: dict):
+    """Write a manifest the way another process restoring a build does
+    """
+    tmp_path = path.join(assets_dir, 'manifest.tmp')
+    with open(tmp_path, 'wt') as f:
+        json.dump(manifest, f)
+    replace(tmp_path, path.join(assets_dir, 'theming-manifest.json'))
+
+
+def test_hashed_copy_is_resolved(assets_dir):
+    from plugins.theming import _manifest
+
+    _manifest.build(PACKAGE_NAME)
+    location = _manifest.resolve(PACKAGE_NAME + '@css/main.css')
+
+    assert location.startswith(PACKAGE_NAME + '@css/main.') and location != PACKAGE_NAME + '@css/main.css'
+    assert path.isfile(path.join(assets_dir, location.split('@')[1]))
+    assert path.isfile(path.join(assets_dir, 'css', 'main.css.gz'))
+    assert _manifest.resolve('plugins.other@css/main.css') == 'plugins.other@css/main.css'
+
+
+def test_manifest_written_by_another_process_is_reloaded(assets_dir):
+    from plugins.theming import _manifest
+
+    _standins.registry['theme.assets_manifest_check_interval'] = 0
+    try:
+        _manifest.build(PACKAGE_NAME)
+        _manifest.resolve(PACKAGE_NAME + '@css/main.css')
+
+        _write_manifest(assets_dir, {'css/main.css': 'css/main.0123456789ab.css'})
+        assert _manifest.resolve(PACKAGE_NAME + '@css/main.css') == PACKAGE_NAME + '@css/main.0123456789ab.css'
+    finally:
+        del _standins.registry['theme.assets_manifest_check_interval']
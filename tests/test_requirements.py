@@ -0,0 +1,63 @@
+"""PytSite Theming Requirements Helpers Tests
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import sys
+import pytest
+import _standins
+from os import path, makedirs
+from zipfile import ZipFile
+
+
+@pytest.fixture
+def sys_path():
+    """sys.path with distributions installed in all supported ways
+    """
+    from plugins.theming import _requirements
+
+    root = path.join(_standins.root_path, 'site')
+    for d in ('site-packages/wheel_pkg-1.2.dist-info', 'site-packages/Legacy.Pkg-2.0-py3.11.egg-info',
+              'site-packages/dir_egg-3.0-py3.11.egg/dir_egg'):
+        makedirs(path.join(root, d), 0o755, True)
+
+    zip_path = path.join(root, 'bundle.zip')
+    with ZipFile(zip_path, 'w') as z:
+        z.writestr('zipped_pkg-4.0.dist-info/METADATA', '')
+
+    egg_path = path.join(root, 'zip_egg-5.0-py3.11.egg')
+    with ZipFile(egg_path, 'w') as z:
+        z.writestr('zip_egg/__init__.py', '')
+
+    orig = list(sys.path)
+    sys.path[:0] = [path.join(root, 'site-packages'), zip_path, egg_path]
+    _requirements.reset_package_versions()
+
+    yield
+
+    sys.path[:] = orig
+    _requirements.reset_package_versions()
+
+
+@pytest.mark.parametrize('name, version', [
+    ('wheel-pkg', '1.2'),
+    ('legacy_pkg', '2.0'),
+    ('dir-egg', '3.0'),
+    ('zipped_pkg', '4.0'),
+    ('zip_egg', '5.0'),
+    ('not_installed', None),
+])
+def test_package_version_is_found_in_sys_path(sys_path, name, version):
+    from plugins.theming import _requirements
+
+    assert _requirements._dist_info_version(name) == version
+
+
+def test_sys_path_is_scanned_once(sys_path, monkeypatch):
+    from plugins.theming import _requirements
+
+    _requirements._dist_info_version('wheel_pkg')
+    monkeypatch.setattr(_requirements, '_sys_path_entries', lambda p: pytest.fail('sys.path is scanned again'))
+
+    assert _requirements._dist_info_version('zip_egg') == '5.0'
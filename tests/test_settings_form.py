@@ -0,0 +1,39 @@
+"""PytSite Theming Settings Form Tests
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import re
+import pytest
+import _standins
+
+THEMES = {'browser_theme_a': '1.2', 'browser_theme_b': '2.0.1'}
+
+
+@pytest.fixture(scope='module')
+def themes():
+    from plugins.theming import _api, _theme
+
+    r = []
+    for name, version in sorted(THEMES.items()):
+        _standins.make_theme(name, version)
+        r.append(_api.register('themes.' + name))
+
+    # Metadata taken from the index is parsed separately from one taken from theme.json
+    r.append(_theme.Theme('themes.browser_theme_c', dict(r[0].metadata, name='browser_theme_c')))
+
+    return r
+
+
+def test_themes_browser_is_rendered(themes):
+    """Table is rendered by the real htmler, which accepts only strings and elements as children
+    """
+    from plugins.theming import _settings_form
+
+    html = _settings_form._ThemesBrowser('themes')._render(themes[0], themes)
+    cells = re.findall(r'<td>\s*([^<]*?)\s*</td>', html)
+
+    for theme in themes:
+        assert theme.name in cells
+        assert str(theme.version) in cells
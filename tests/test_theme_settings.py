@@ -0,0 +1,59 @@
+"""PytSite Theming Theme Settings Tests
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import json
+import pytest
+import _standins
+from os import path
+
+
+def _make_theme(name: str, settings: dict):
+    from plugins.theming import _theme
+
+    json_path = path.join(_standins.make_theme(name), 'theme.json')
+    with open(json_path) as f:
+        data = json.load(f)
+    data['settings'] = settings
+    with open(json_path, 'wt') as f:
+        json.dump(data, f)
+
+    return _theme.Theme('themes.' + name)
+
+
+@pytest.fixture
+def theme():
+    theme = _make_theme('settings_theme', {'per_page': 10, 'banner': False})
+    _standins.registry['theme.theme_settings_theme'] = {'per_page': '25'}
+
+    yield theme
+
+    del _standins.registry['theme.theme_settings_theme']
+
+
+def test_settings_are_typed(theme):
+    assert theme.settings['per_page'] == 25
+    assert theme.settings.per_page == 25
+    assert theme.settings.banner is False
+
+
+def test_settings_can_be_changed_like_dict(theme):
+    changes = []
+    theme.settings.on_change(lambda: changes.append(True))
+
+    theme.settings['banner'] = 'yes'
+    theme.settings.update(per_page='5', extra=1)
+    del theme.settings['extra']
+
+    assert theme.settings.copy() == {'per_page': 5, 'banner': True}
+    assert _standins.registry['theme.theme_settings_theme'] == {'per_page': 5, 'banner': True}
+    assert len(changes) == 3
+
+
+def test_reserved_settings_names_are_rejected():
+    from plugins.theming import _error
+
+    with pytest.raises(_error.ThemeInitError):
+        _make_theme('reserved_settings_theme', {'items': 3}).load_metadata()
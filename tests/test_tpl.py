@@ -0,0 +1,145 @@
+"""PytSite Theming Templates Precompilation Tests
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import sys
+import jinja2
+import pytest
+import _standins
+from os import path, makedirs
+
+THEME_NAME = 'tpl_theme'
+TEMPLATES = {
+    'index': '<main>{% include "$theme@parts/header" %}{{ title }}</main>',
+    'parts/header': '<header>{{ title|upper }}</header>',
+}
+
+
+class _Loader(jinja2.BaseLoader):
+    """Loader which behaves like PytSite's one: resolves locations via event handlers and never reports templates as
+    up to date
+    """
+
+    def get_source(self, environment, location: str) -> tuple:
+        for handler in _standins.events.get('tpl@resolve_location', []):
+            location = handler(location)
+
+        package_name, tpl_name = location.split('@')
+        tpl_path = path.join(_standins.themes_path, package_name.split('.')[1], 'res', 'tpl', tpl_name + '.jinja2')
+        if not path.exists(tpl_path):
+            raise jinja2.TemplateNotFound(location)
+
+        with open(tpl_path, encoding='utf-8') as f:
+            return f.read(), tpl_path, lambda: False
+
+
+class _Environment(jinja2.Environment):
+    """Environment which counts compilations
+    """
+
+    def __init__(self):
+        super().__init__(loader=_Loader())
+        self.compiled = []
+
+    def compile(self, source, name=None, filename=None, *args, **kwargs):
+        self.compiled.append(name)
+        return super().compile(source, name, filename, *args, **kwargs)
+
+
+@pytest.fixture(scope='module')
+def theming():
+    theme_path = _standins.make_theme(THEME_NAME)
+    for name, source in TEMPLATES.items():
+        tpl_path = path.join(theme_path, 'res', 'tpl', name + '.jinja2')
+        makedirs(path.dirname(tpl_path), 0o755, True)
+        with open(tpl_path, 'wt') as f:
+            f.write(source)
+
+    import plugins.theming
+    from plugins.theming import _api, _eh
+
+    # Theme is referenced as '$theme' by templates
+    _standins.registry['theme.current'] = 'themes.' + THEME_NAME
+    _api.register('themes.' + THEME_NAME)
+    _standins.events['tpl@resolve_location'] = [_eh.on_tpl_resolve_location]
+
+    return plugins.theming
+
+
+def _start_worker(cache_dir: str) -> _Environment:
+    """Simulate start of an application process
+    """
+    from plugins.theming import _tpl
+
+    env = sys.modules['pytsite.tpl']._env = _Environment()
+    _tpl.enable_bytecode_cache(cache_dir)
+
+    return env
+
+
+@pytest.mark.parametrize('name', ['$theme@index', 'index', 'themes.{}@index'.format(THEME_NAME)])
+def test_precompiled_templates_are_not_compiled_on_request(theming, tmpdir, name):
+    from plugins.theming import _tpl
+
+    env = _start_worker(str(tmpdir))
+    assert _tpl.precompile('themes.' + THEME_NAME, path.join(_standins.themes_path, THEME_NAME)) == len(TEMPLATES)
+    assert len(env.compiled) == len(TEMPLATES)
+
+    del env.compiled[:]
+    for _ in range(3):
+        assert env.get_template(name).render(title='Hello') == '<main><header>HELLO</header>Hello</main>'
+
+    assert env.compiled == []
+
+
+def test_templates_precompiled_by_another_process_are_not_compiled_on_request(theming, tmpdir):
+    from plugins.theming import _tpl
+
+    _start_worker(str(tmpdir))
+    _tpl.precompile('themes.' + THEME_NAME, path.join(_standins.themes_path, THEME_NAME))
+
+    env = _start_worker(str(tmpdir))
+    env.get_template('$theme@index').render(title='Hello')
+
+    assert env.compiled == []
+
+
+def test_changed_template_is_compiled_again(theming, tmpdir):
+    from plugins.theming import _tpl
+
+    env = _start_worker(str(tmpdir))
+    _tpl.precompile('themes.' + THEME_NAME, path.join(_standins.themes_path, THEME_NAME))
+
+    tpl_path = path.join(_standins.themes_path, THEME_NAME, 'res', 'tpl', 'parts', 'header.jinja2')
+    with open(tpl_path, 'wt') as f:
+        f.write('<header>{{ title|lower }}</header>')
+
+    try:
+        del env.compiled[:]
+        assert env.get_template('index').render(title='Hello') == '<main><header>hello</header>Hello</main>'
+        assert env.compiled == ['$theme@parts/header']
+    finally:
+        with open(tpl_path, 'wt') as f:
+            f.write(TEMPLATES['parts/header'])
+
+
+def test_watch_mode_invalidates_changed_template(theming, tmpdir):
+    from plugins.theming import _api, _tpl, _watch
+
+    env = _start_worker(str(tmpdir))
+    _tpl.precompile('themes.' + THEME_NAME, path.join(_standins.themes_path, THEME_NAME))
+    env.get_template('$theme@index').render(title='Hello')
+
+    tpl_path = path.join(_standins.themes_path, THEME_NAME, 'res', 'tpl', 'parts', 'header.jinja2')
+    _watch._Watcher([_api.get('themes.' + THEME_NAME)]).apply([tpl_path])
+
+    key = env.bytecode_cache.get_cache_key('$theme@parts/header', tpl_path)
+    assert [t for t in env.cache.values() if t.filename == tpl_path] == []
+    assert key not in env.bytecode_cache._codes
+    assert not path.exists(path.join(str(tmpdir), env.bytecode_cache.pattern % key))
+
+    del env.compiled[:]
+    env.get_template('index').render(title='Hello')
+    assert env.compiled == ['$theme@parts/header']